@@ -1,14 +1,16 @@
 import os
 
-from stable_baselines3 import PPO
-from stable_baselines3.common.vec_env import SubprocVecEnv
-from stable_baselines3.common.callbacks import CheckpointCallback
-import pygame
+import numpy as np
 
 from envs.snake_env import SnakeEnv
+from envs.observation import FLAT_OBS_MODES
+from evaluation import checkpoint_timesteps, list_checkpoints
+from framebuffer import tile_frames, tile_layout
+from numpypolicy import NumpyPolicy, exported_or_checkpoint_path, load_policy
+from trainconfig import TrainConfig
 
 class AIController:
-    def __init__(self, game_name: str, grid_size_pixels: int, grid_num_squares: int, framerate: int, scratch_dir: str, model_checkpoints_dir: str, training_run_prefix: str, inputs_enabled: bool = False, rendering_enabled: bool = False, debug: bool = False):
+    def __init__(self, game_name: str, grid_size_pixels: int, grid_num_squares: int, framerate: int, scratch_dir: str, model_checkpoints_dir: str, training_run_prefix: str, inputs_enabled: bool = False, rendering_enabled: bool = False, debug: bool = False, obs_mode: str = "flat", view_size: int = None, record_path: str = None, space_features: bool = False):
         self.game_name = game_name
         self.grid_size_pixels = grid_size_pixels
         self.grid_num_squares = grid_num_squares
@@ -20,8 +22,22 @@ class AIController:
         self.model_path = os.path.join(self.scratch_dir, model_checkpoints_dir)
         self.model_prefix = "snake_ppo_model"
         self.training_run_prefix = training_run_prefix
+        self.obs_mode = obs_mode
+        # Observed grid size, fixed so that a policy carries over boards of several sizes
+        self.view_size = view_size or grid_num_squares
+        # Reachable space and apple path features, see envs.spacefeatures
+        self.space_features = space_features
+        # Compact observation modes are Dict observations
+        self.policy = "MlpPolicy" if obs_mode in FLAT_OBS_MODES else "MultiInputPolicy"
+        self.profile = False
+        # Replay file of the episodes played by run
+        self.record_path = record_path
+        # Directory of the replay files written by the training envs, None to not record them
+        self.replays_path = None
+        # Training envs are stepped by stepkernel.TKernelGame
+        self.step_kernel = False
 
-    def __make_env(self, rank):
+    def __make_env(self, rank, grid_num_squares: int):
         """
         Utility function for multiprocessed env.
         """
@@ -29,57 +45,147 @@ class AIController:
             env = SnakeEnv(
                 game_name=self.game_name,
                 grid_size_pixels=self.grid_size_pixels,
-                grid_num_squares=self.grid_num_squares,
+                grid_num_squares=grid_num_squares,
                 framerate=self.framerate,
                 inputs_enabled=self.inputs_enabled,
                 rendering_enabled=self.rendering_enabled,
-                debug=self.debug
+                debug=self.debug,
+                obs_mode=self.obs_mode,
+                profile=self.profile,
+                view_size=self.view_size,
+                space_features=self.space_features,
+                record_path=os.path.join(self.replays_path, f"env_{rank}.replay") if self.replays_path else None,
+                step_kernel=self.step_kernel,
+                # Only the changed cells are repainted, which keeps large boards cheap
+                incremental_observation=True
             )
             return env
         return _init
 
-    def train(self):
-        """Train the snake AI model"""
+    def train(self, config: TrainConfig = None, profile: bool = False, resume: bool = False):
+        """
+        Train the snake AI model with the settings of config.
+        When config.vec_envs is set, games are stepped in-process by a VecSnakeEnv instead of subprocesses.
+        profile times the step phases of every subprocess env and logs them to TensorBoard after each rollout.
+        config.curriculum lists board sizes played in turn, each for an equal share of the run, within the view size.
+        resume continues the run from its newest checkpoint up to config.total_timesteps.
+        config.record_episodes appends the episodes of each subprocess env to a replay file in the run's replays directory.
+        config.step_kernel steps the subprocess envs with the step kernel.
+        """
+        # torch and stable_baselines3 are only loaded to train, playing an exported model needs neither
+        import torch as th
+        from stable_baselines3 import PPO
+
+        from callbacks import AsyncCheckpointCallback, CurriculumCallback, ProfilingCallback
+        from envs.sb3_vec_env import SB3VecSnakeEnv
+        from envs.shm_vec_env import SharedMemoryVecEnv
+
+        config = config or TrainConfig()
+        curriculum = config.curriculum
+        if curriculum and max(curriculum) > self.view_size:
+            raise ValueError(f"Curriculum boards up to {max(curriculum)} squares do not fit the observed view of {self.view_size} squares.")
+        if profile and config.vec_envs > 0:
+            raise ValueError("Profiling is only available for subprocess envs, not with vec_envs.")
+        if config.record_episodes and config.vec_envs > 0:
+            raise ValueError("Episodes are only recorded by subprocess envs, not with vec_envs.")
+        if config.step_kernel and config.vec_envs > 0:
+            raise ValueError("The step kernel only steps subprocess envs, not with vec_envs.")
+        self.profile = profile
+        self.step_kernel = config.step_kernel
+
+        run_path = os.path.join(self.model_path, self.training_run_prefix)
+        resume_path = None
+        if resume:
+            checkpoints = list_checkpoints(run_path, self.model_prefix) if os.path.isdir(run_path) else []
+            if not checkpoints:
+                raise FileNotFoundError(f"No checkpoint to resume from in {run_path}")
+            # The final model of a run that was resumed, then interrupted, is older than the snapshots listed before it
+            resume_path = max(checkpoints, key=lambda checkpoint: checkpoint_timesteps(checkpoint[1]))[1]
+        config.save(run_path)
+
+        if config.torch_threads:
+            th.set_num_threads(config.torch_threads)
+
+        if config.record_episodes:
+            self.replays_path = os.path.join(run_path, "replays")
 
-        # Create 8 environments running in parallel
-        num_envs = 8
-        env = SubprocVecEnv([self.__make_env(i) for i in range(num_envs)])
+        grid_num_squares = curriculum[0] if curriculum else self.grid_num_squares
+        if config.vec_envs > 0:
+            env = SB3VecSnakeEnv(num_envs=config.vec_envs, grid_num_squares=grid_num_squares, obs_mode=self.obs_mode, view_size=self.view_size,
+                                 space_features=self.space_features)
+        else:
+            # Environments running in parallel, exchanging step data through shared memory
+            num_envs = config.resolved_num_envs()
+            env = SharedMemoryVecEnv([self.__make_env(i, grid_num_squares) for i in range(num_envs)])
 
         try:
-            # Initialize the PPO agent
-            model = PPO("MlpPolicy",
-                    env,
-                    device="cpu",
-                    verbose=1, 
-                    learning_rate=0.0003,
-                    n_steps=2048,
-                    batch_size=64,
-                    n_epochs=10,
-                    tensorboard_log="./.tmp/tensorboard"
+            hyperparameters = dict(
+                learning_rate=config.learning_rate,
+                n_steps=config.n_steps,
+                batch_size=config.batch_size,
+                n_epochs=config.n_epochs,
+                gamma=config.gamma,
+                gae_lambda=config.gae_lambda,
+                clip_range=config.clip_range,
+                ent_coef=config.ent_coef,
+                tensorboard_log="./.tmp/tensorboard"
             )
 
-            # Create checkpoint callback
-            checkpoint_callback = CheckpointCallback(
-                save_freq=100_000,  # Save every 100k steps
-                save_path=os.path.join(self.model_path, self.training_run_prefix),
+            if resume_path:
+                print(f"Resuming {self.training_run_prefix} from {resume_path}")
+                model = PPO.load(resume_path, env=env, device="cpu", verbose=1, **hyperparameters)
+            else:
+                # Initialize the PPO agent
+                model = PPO(self.policy, env, device="cpu", verbose=1, **hyperparameters)
+
+            # Create checkpoint callback, save_freq counts calls to env.step, each stepping every env
+            checkpoint_callback = AsyncCheckpointCallback(
+                save_freq=max(config.checkpoint_freq // env.num_envs, 1),
+                save_path=run_path,
                 name_prefix=self.model_prefix,
-                save_replay_buffer=True,
-                save_vecnormalize=True
+                keep_last=config.keep_checkpoints
             )
 
-            # Train the agent
-            model.learn(total_timesteps=2_000_000
-                        ,callback=checkpoint_callback
+            callbacks = [checkpoint_callback]
+            if profile:
+                callbacks.append(ProfilingCallback())
+            if curriculum:
+                callbacks.append(CurriculumCallback(curriculum, config.total_timesteps))
+
+            # Train the agent, a resumed run only plays the timesteps it has left
+            model.learn(total_timesteps=max(config.total_timesteps - model.num_timesteps, 0)
+                        ,callback=callbacks
                         ,tb_log_name=f"{self.training_run_prefix}"
+                        ,reset_num_timesteps=resume_path is None
             )
             
-            # Save the final model
-            model.save(os.path.join(self.model_path, self.training_run_prefix, self.model_prefix))
+            # Save the final model, along with its NumPy weights when the policy can be exported
+            model.save(os.path.join(run_path, self.model_prefix))
+            if self.policy == "MlpPolicy":
+                NumpyPolicy.from_model(model).save(os.path.join(run_path, self.model_prefix + ".npz"))
         finally:
             env.close()
 
+    def load_model(self):
+        """
+        Returns the final model of the training run, from its exported NumPy weights when they are up to date,
+        which spares loading torch and stable_baselines3.
+        """
+        model_path = os.path.join(self.model_path, self.training_run_prefix, self.model_prefix)
+        return load_policy(exported_or_checkpoint_path(model_path + ".zip"))
+
+    def export_model(self) -> str:
+        """Exports the final MlpPolicy model of the training run to NumPy weights next to it, returns their path"""
+        from numpypolicy import export_checkpoint
+
+        model_path = os.path.join(self.model_path, self.training_run_prefix, self.model_prefix)
+        export_checkpoint(model_path + ".zip", model_path + ".npz")
+        return model_path + ".npz"
+
     def run(self):
         """Run the trained snake AI model"""
+        import pygame
+
         env = SnakeEnv(
             game_name=self.game_name,
             grid_size_pixels=self.grid_size_pixels,
@@ -87,11 +193,14 @@ class AIController:
             framerate=self.framerate,
             inputs_enabled=self.inputs_enabled,
             rendering_enabled=self.rendering_enabled,
-            debug=self.debug
-        )
-        model = PPO.load(os.path.join(self.model_path, self.training_run_prefix, self.model_prefix),
-                         device="cpu"
+            debug=self.debug,
+            obs_mode=self.obs_mode,
+            view_size=self.view_size,
+            record_path=self.record_path,
+            space_features=self.space_features
         )
+        model = self.load_model()
+        clock = pygame.time.Clock()
         
         obs, _ = env.reset()
         while True:
@@ -99,11 +208,61 @@ class AIController:
             obs, reward, terminated, truncated, info = env.step(action)
 
             env.render()
-            pygame.time.wait(50)
+            clock.tick(self.framerate)
             
             if terminated or truncated:
                 obs, _ = env.reset()
                 
             if env.tgame.is_terminated:
                 env.close()
-                break
\ No newline at end of file
+                break
+
+    def spectate(self, num_games: int, window_size_pixels: int = 1000):
+        """
+        Run the trained snake AI model on num_games games at once, drawn as tiles of a single window.
+        The games are stepped by a VecSnakeEnv, the policy is batched over all observations and
+        frames are painted from the games' state arrays.
+        """
+        import pygame
+        from envs.vec_snake_env import VecSnakeEnv
+
+        num_rows, num_cols = tile_layout(num_games)
+        cell_pixels = max(window_size_pixels // (max(num_rows, num_cols) * self.view_size), 1)
+        env = VecSnakeEnv(num_envs=num_games, grid_num_squares=self.grid_num_squares, obs_mode=self.obs_mode,
+                          render_mode="rgb_array", cell_pixels=cell_pixels, view_size=self.view_size,
+                          space_features=self.space_features)
+        model = self.load_model()
+
+        obs = env.reset()
+        canvas = tile_frames(env.render_frames())
+
+        pygame.init()
+        pygame.display.set_caption(self.game_name)
+        screen = pygame.display.set_mode((canvas.shape[1], canvas.shape[0]))
+        clock = pygame.time.Clock()
+
+        episodes = 0
+        total_score = 0
+        running = True
+        while running:
+            for event in pygame.event.get():
+                if event.type == pygame.QUIT:
+                    running = False
+
+            actions, _ = model.predict(obs, deterministic=True)
+            obs, rewards, dones, infos = env.step(actions)
+
+            for i in np.flatnonzero(dones):
+                episodes += 1
+                total_score += infos[i]["episode_score"]
+            if episodes > 0:
+                pygame.display.set_caption(f"{self.game_name} - {episodes} episodes, mean score {total_score / episodes:.2f}")
+
+            tile_frames(env.render_frames(), out=canvas)
+            pygame.surfarray.blit_array(screen, canvas.transpose(1, 0, 2))
+            pygame.display.flip()
+
+            clock.tick(self.framerate)
+
+        env.close()
+        pygame.quit()
@@ -0,0 +1,322 @@
+import argparse
+from datetime import datetime
+import json
+import os
+import platform
+import sys
+import time
+
+import numpy as np
+
+from snake import Orientation
+from gamecore import TGameCore
+from envs.snake_env import SnakeEnv
+from envs.observation import ObservationBuilder
+
+# Scripted policies: (tgame, rng) -> action value
+
+def random_policy(tgame: TGameCore, rng: np.random.Generator) -> int:
+    return int(rng.integers(4))
+
+def wall_hugging_policy(tgame: TGameCore, rng: np.random.Generator) -> int:
+    """Walks clockwise along the border, only eating apples that spawn on it"""
+    x, y = tgame.tsnake.head_x, tgame.tsnake.head_y
+    last = tgame.grid_num_squares - 1
+
+    if y == 0 and x < last:
+        return Orientation.RIGHT.value
+    if x == last and y < last:
+        return Orientation.DOWN.value
+    if y == last and x > 0:
+        return Orientation.LEFT.value
+    return Orientation.UP.value
+
+def long_snake_policy(tgame: TGameCore, rng: np.random.Generator) -> int:
+    """
+    Follows a Hamiltonian cycle (even grid sizes only), so the snake never dies and grows until the board is full.
+    The cycle runs right along the top row, zigzags down through columns 1..n-1 and returns up column 0.
+    """
+    x, y = tgame.tsnake.head_x, tgame.tsnake.head_y
+    last = tgame.grid_num_squares - 1
+
+    if x == 0:
+        return Orientation.UP.value if y > 0 else Orientation.RIGHT.value
+    if y == 0:
+        return Orientation.RIGHT.value if x < last else Orientation.DOWN.value
+    if y % 2 == 1:
+        if x > 1:
+            return Orientation.LEFT.value
+        return Orientation.DOWN.value if y < last else Orientation.LEFT.value
+    return Orientation.RIGHT.value if x < last else Orientation.DOWN.value
+
+POLICIES = {
+    "random": random_policy,
+    "wall_hugging": wall_hugging_policy,
+    "long_snake": long_snake_policy,
+}
+
+def grid_size_pixels_for(grid_num_squares: int) -> int:
+    return max(600 // grid_num_squares, 1) * grid_num_squares
+
+def make_env(grid_num_squares: int, incremental_observation: bool = False, rendering_enabled: bool = False) -> SnakeEnv:
+    return SnakeEnv(
+        game_name="Snake benchmark",
+        grid_size_pixels=grid_size_pixels_for(grid_num_squares),
+        grid_num_squares=grid_num_squares,
+        framerate=0,
+        inputs_enabled=False,
+        rendering_enabled=rendering_enabled,
+        incremental_observation=incremental_observation
+    )
+
+def record(results: list, name: str, policy: str, grid_num_squares: int, metric: str, value: float, higher_is_better: bool, **extra):
+    results.append({
+        "name": name,
+        "policy": policy,
+        "grid_num_squares": grid_num_squares,
+        "metric": metric,
+        "value": value,
+        "higher_is_better": higher_is_better,
+        **extra
+    })
+
+def bench_env_step(results: list, grid_num_squares: int, policy_name: str, num_steps: int, seed: int, incremental_observation: bool):
+    policy = POLICIES[policy_name]
+    rng = np.random.default_rng(seed)
+    env = make_env(grid_num_squares, incremental_observation=incremental_observation)
+    env.reset(seed=seed)
+
+    resets = 0
+    total_length = 0
+    start = time.perf_counter()
+    for _ in range(num_steps):
+        _, _, terminated, truncated, _ = env.step(policy(env.tgame, rng))
+        total_length += len(env.tgame.tsnake.snake_parts) + 1
+        if terminated or truncated:
+            env.reset()
+            resets += 1
+    elapsed = time.perf_counter() - start
+    env.close()
+
+    name = "env_step_incremental" if incremental_observation else "env_step"
+    record(results, name, policy_name, grid_num_squares, "steps_per_sec", num_steps / elapsed, True,
+           episodes=resets, mean_snake_length=total_length / num_steps)
+
+def bench_core_and_observation(results: list, grid_num_squares: int, policy_name: str, num_steps: int, seed: int):
+    """Times TGameCore.perform_action, both observation builds and the space features on the same trajectory"""
+    policy = POLICIES[policy_name]
+    rng = np.random.default_rng(seed)
+    tgame = TGameCore.initialize("Snake benchmark", grid_num_squares, debug=False, rng=np.random.default_rng(seed))
+    full_builder = ObservationBuilder(tgame)
+    incremental_builder = ObservationBuilder(tgame, incremental=True, copy=False)
+    space_builder = ObservationBuilder(tgame, incremental=True, copy=False, space_features=True)
+
+    action_time = 0.0
+    reset_time = 0.0
+    full_obs_time = 0.0
+    incremental_obs_time = 0.0
+    space_obs_time = 0.0
+    resets = 0
+
+    tgame.reset()
+    for _ in range(num_steps):
+        orientation = Orientation(policy(tgame, rng))
+
+        t0 = time.perf_counter()
+        tgame.perform_action(orientation)
+        t1 = time.perf_counter()
+        full_builder.build()
+        t2 = time.perf_counter()
+        incremental_builder.build()
+        t3 = time.perf_counter()
+        space_builder.build()
+        t4 = time.perf_counter()
+
+        action_time += t1 - t0
+        full_obs_time += t2 - t1
+        incremental_obs_time += t3 - t2
+        space_obs_time += t4 - t3
+
+        if not tgame.tsnake.is_alive or tgame.is_won:
+            t0 = time.perf_counter()
+            tgame.reset()
+            reset_time += time.perf_counter() - t0
+            incremental_builder.reset()
+            space_builder.reset()
+            resets += 1
+
+    record(results, "core_step", policy_name, grid_num_squares, "steps_per_sec", num_steps / action_time, True)
+    record(results, "observation_full", policy_name, grid_num_squares, "seconds_per_build", full_obs_time / num_steps, False)
+    record(results, "observation_incremental", policy_name, grid_num_squares, "seconds_per_build", incremental_obs_time / num_steps, False)
+    record(results, "observation_space_features", policy_name, grid_num_squares, "seconds_per_build", space_obs_time / num_steps, False)
+    if resets > 0:
+        record(results, "core_reset", policy_name, grid_num_squares, "seconds_per_reset", reset_time / resets, False)
+
+def bench_step_kernel(results: list, grid_num_squares: int, policy_name: str, num_steps: int, seed: int):
+    """Checks the step kernel against TGameCore on a policy's trajectory, then times it replaying the same actions"""
+    from stepkernel import HAS_NUMBA, STEP_DIED, STEP_WON, TKernelGame, check_against_tgame
+
+    actions = check_against_tgame(grid_num_squares, POLICIES[policy_name], num_steps, seed)["actions"]
+
+    kgame = TKernelGame.initialize("Snake benchmark", grid_num_squares, debug=False, rng=np.random.default_rng(seed))
+    kgame.reset()
+    start = time.perf_counter()
+    for action in actions:
+        if kgame.step(action) in (STEP_DIED, STEP_WON):
+            kgame.reset()
+    elapsed = time.perf_counter() - start
+
+    record(results, "kernel_step", policy_name, grid_num_squares, "steps_per_sec", num_steps / elapsed, True, numba=HAS_NUMBA)
+
+def bench_env_reset(results: list, grid_num_squares: int, num_resets: int, seed: int):
+    env = make_env(grid_num_squares)
+    env.reset(seed=seed)
+
+    start = time.perf_counter()
+    for _ in range(num_resets):
+        env.reset()
+    elapsed = time.perf_counter() - start
+    env.close()
+
+    record(results, "env_reset", "none", grid_num_squares, "seconds_per_reset", elapsed / num_resets, False)
+
+def bench_render(results: list, grid_num_squares: int, policy_name: str, num_frames: int, seed: int):
+    # Allow rendering benchmarks on machines without a display
+    if "DISPLAY" not in os.environ and "WAYLAND_DISPLAY" not in os.environ:
+        os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+
+    policy = POLICIES[policy_name]
+    rng = np.random.default_rng(seed)
+    env = make_env(grid_num_squares, rendering_enabled=True)
+    env.reset(seed=seed)
+
+    render_time = 0.0
+    for _ in range(num_frames):
+        _, _, terminated, truncated, _ = env.step(policy(env.tgame, rng))
+        if terminated or truncated:
+            env.reset()
+
+        t0 = time.perf_counter()
+        env.tgame.renderer.render_all()
+        render_time += time.perf_counter() - t0
+    env.close()
+
+    record(results, "render", policy_name, grid_num_squares, "seconds_per_frame", render_time / num_frames, False)
+
+def bench_vec_env(results: list, name: str, env, grid_num_squares: int, num_steps: int, seed: int):
+    rng = np.random.default_rng(seed)
+    env.seed(seed)
+    env.reset()
+
+    start = time.perf_counter()
+    for _ in range(num_steps):
+        env.step(rng.integers(4, size=env.num_envs))
+    elapsed = time.perf_counter() - start
+    env.close()
+
+    record(results, name, "random", grid_num_squares, "steps_per_sec", num_steps * env.num_envs / elapsed, True,
+           num_envs=env.num_envs)
+
+def compare_to_baseline(results: list, baseline: dict, tolerance: float) -> list:
+    """Returns a description of every metric that got worse than the baseline by more than tolerance"""
+    def key(r):
+        return (r["name"], r["policy"], r["grid_num_squares"], r["metric"])
+
+    baseline_values = {key(r): r["value"] for r in baseline["results"]}
+    regressions = []
+    for r in results:
+        before = baseline_values.get(key(r))
+        if before is None or before == 0:
+            continue
+
+        change = (r["value"] - before) / before
+        if not r["higher_is_better"]:
+            change = -change
+        if change < -tolerance:
+            regressions.append(f"{'/'.join(str(k) for k in key(r))}: {before:.6g} -> {r['value']:.6g} ({change:+.1%})")
+    return regressions
+
+def parse_commandline_args():
+    parser = argparse.ArgumentParser(description="Step-throughput benchmarks for the env, game core and renderer", add_help=True)
+    parser.add_argument('--grid-sizes', type=int, nargs='+', default=[10, 20, 40], dest="grid_sizes", help='Board sizes to benchmark (even sizes for long_snake)')
+    parser.add_argument('--policies', type=str, nargs='+', default=list(POLICIES), choices=list(POLICIES), help='Scripted policies to run')
+    parser.add_argument('--steps', type=int, default=20_000, help='Steps per single-env benchmark')
+    parser.add_argument('--seed', type=int, default=0, help='Seed for envs and policies')
+    parser.add_argument('--vec-envs', type=int, default=256, dest="vec_envs", help='Number of envs in the in-process vectorized env')
+    parser.add_argument('--subproc-envs', type=int, default=8, dest="subproc_envs", help='Number of SubprocVecEnv and SharedMemoryVecEnv workers')
+    parser.add_argument('--vec-steps', type=int, default=500, dest="vec_steps", help='Steps per vectorized env benchmark')
+    parser.add_argument('--render-frames', type=int, default=500, dest="render_frames", help='Frames per render benchmark')
+    parser.add_argument('--skip-render', default=False, action='store_true', dest="skip_render", help='Skip renderer benchmarks')
+    parser.add_argument('--skip-vec', default=False, action='store_true', dest="skip_vec", help='Skip vectorized env benchmarks')
+    parser.add_argument('--output', type=str, default=None, help='Write results as JSON to this file')
+    parser.add_argument('--baseline', type=str, default=None, help='JSON results of a previous run to compare against')
+    parser.add_argument('--tolerance', type=float, default=0.15, help='Allowed relative slowdown before a metric counts as a regression')
+    return parser.parse_args()
+
+def main():
+    args = parse_commandline_args()
+    results = []
+
+    for grid_num_squares in args.grid_sizes:
+        for policy_name in args.policies:
+            if policy_name == "long_snake" and grid_num_squares % 2 == 1:
+                continue
+
+            bench_env_step(results, grid_num_squares, policy_name, args.steps, args.seed, incremental_observation=False)
+            bench_env_step(results, grid_num_squares, policy_name, args.steps, args.seed, incremental_observation=True)
+            bench_core_and_observation(results, grid_num_squares, policy_name, args.steps, args.seed)
+            bench_step_kernel(results, grid_num_squares, policy_name, args.steps, args.seed)
+
+        bench_env_reset(results, grid_num_squares, max(args.steps // 20, 1), args.seed)
+
+        if not args.skip_render:
+            bench_render(results, grid_num_squares, "random", args.render_frames, args.seed)
+
+        if not args.skip_vec:
+            from stable_baselines3.common.vec_env import SubprocVecEnv
+            from envs.vec_snake_env import VecSnakeEnv
+            from envs.shm_vec_env import SharedMemoryVecEnv
+
+            subproc_env = SubprocVecEnv([lambda g=grid_num_squares: make_env(g) for _ in range(args.subproc_envs)])
+            bench_vec_env(results, "subproc_vec_env", subproc_env, grid_num_squares, args.vec_steps, args.seed)
+
+            shm_env = SharedMemoryVecEnv([lambda g=grid_num_squares: make_env(g) for _ in range(args.subproc_envs)])
+            bench_vec_env(results, "shm_vec_env", shm_env, grid_num_squares, args.vec_steps, args.seed)
+
+            vec_env = VecSnakeEnv(num_envs=args.vec_envs, grid_num_squares=grid_num_squares)
+            bench_vec_env(results, "vec_snake_env", vec_env, grid_num_squares, args.vec_steps, args.seed)
+
+            vec_env = VecSnakeEnv(num_envs=args.vec_envs, grid_num_squares=grid_num_squares, space_features=True)
+            bench_vec_env(results, "vec_snake_env_space", vec_env, grid_num_squares, args.vec_steps, args.seed)
+
+    for r in results:
+        print(f"{r['name']:<26} {r['policy']:<13} {r['grid_num_squares']:>4}  {r['metric']:<18} {r['value']:.6g}")
+
+    report = {
+        "meta": {
+            "timestamp": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "numpy": np.__version__,
+            "args": vars(args),
+        },
+        "results": results,
+    }
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+
+        regressions = compare_to_baseline(results, baseline, args.tolerance)
+        if regressions:
+            print("Regressions against baseline:")
+            for line in regressions:
+                print(f"  {line}")
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main()
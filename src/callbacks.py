@@ -0,0 +1,171 @@
+from concurrent.futures import ThreadPoolExecutor
+import copy
+import os
+import time
+
+import numpy as np
+import torch as th
+
+from stable_baselines3.common.callbacks import BaseCallback
+from stable_baselines3.common.save_util import recursive_getattr, save_to_zip_file
+
+from evaluation import list_snapshots
+from profiler import histogram_percentile, merge_stats
+
+class ProfilingCallback(BaseCallback):
+    """
+    Collects the phase timings of profiled SnakeEnv workers after every rollout and logs them to TensorBoard:
+    mean, p50 and p99 per phase, a histogram of call durations and the share of the rollout spent stepping envs.
+    The rest of the rollout time goes to IPC and policy inference.
+    """
+
+    def __init__(self, verbose: int = 0):
+        super().__init__(verbose)
+        self.rollout_start = None
+
+    def _on_rollout_start(self):
+        self.training_env.env_method("reset_stats")
+        self.rollout_start = time.perf_counter()
+
+    def _on_step(self) -> bool:
+        return True
+
+    def _on_rollout_end(self):
+        rollout_ns = (time.perf_counter() - self.rollout_start) * 1e9
+        worker_stats = self.training_env.env_method("get_stats")
+        stats = merge_stats(worker_stats)
+
+        for phase, s in stats.items():
+            if s["calls"] == 0:
+                continue
+
+            self.logger.record(f"profile/{phase}_mean_us", s["total_ns"] / s["calls"] / 1000)
+            self.logger.record(f"profile/{phase}_p50_us", histogram_percentile(s["histogram"], 50) / 1000)
+            self.logger.record(f"profile/{phase}_p99_us", histogram_percentile(s["histogram"], 99) / 1000)
+
+            # Durations are only known up to their power-of-two bucket, which is enough for a log-scale histogram
+            bucket_log2_ns = np.repeat(np.arange(len(s["histogram"]), dtype=np.float32), s["histogram"])
+            self.logger.record(f"profile/{phase}_log2_ns", th.from_numpy(bucket_log2_ns),
+                               exclude=("stdout", "log", "json", "csv"))
+
+        step = stats.get("step")
+        if step is not None and len(worker_stats) > 0:
+            self.logger.record("profile/env_step_share", step["total_ns"] / len(worker_stats) / rollout_ns)
+
+class CurriculumCallback(BaseCallback):
+    """
+    Grows the board of every training env through grid_sizes, spending an equal share of total_timesteps on each size.
+    Envs switch to a new size as their games reset, so the observed view must fit the largest board.
+    """
+
+    def __init__(self, grid_sizes: list, total_timesteps: int, verbose: int = 0):
+        super().__init__(verbose)
+        self.grid_sizes = list(grid_sizes)
+        self.total_timesteps = total_timesteps
+        self.stage = 0
+
+    def _on_training_start(self):
+        self._set_stage(0)
+
+    def _on_step(self) -> bool:
+        stage = min(self.num_timesteps * len(self.grid_sizes) // self.total_timesteps, len(self.grid_sizes) - 1)
+        if stage != self.stage:
+            self._set_stage(stage)
+        return True
+
+    def _on_rollout_end(self):
+        self.logger.record("curriculum/grid_num_squares", self.grid_sizes[self.stage])
+
+    def _set_stage(self, stage: int):
+        self.stage = stage
+        self.training_env.env_method("set_grid_num_squares", self.grid_sizes[stage])
+        if self.verbose > 0:
+            print(f"Curriculum: training on {self.grid_sizes[stage]}x{self.grid_sizes[stage]} boards from step {self.num_timesteps}")
+
+class AsyncCheckpointCallback(BaseCallback):
+    """
+    Saves the model every save_freq calls to env.step without stalling training: the model data and the
+    policy/optimizer state are copied in memory and zipped to disk by a background thread, written to a
+    temporary file first and renamed into place so that an interrupted write never leaves a truncated snapshot.
+    Only the last keep_last snapshots are kept, plus the one with the best mean score over the episodes finished
+    since the previous snapshot. Snapshots already in save_path, e.g. of a resumed run, count towards keep_last
+    but have no score. PPO is on-policy, so there is no replay buffer to save.
+    """
+
+    def __init__(self, save_freq: int, save_path: str, name_prefix: str, keep_last: int = 5, verbose: int = 0):
+        super().__init__(verbose)
+        self.save_freq = save_freq
+        self.save_path = save_path
+        self.name_prefix = name_prefix
+        self.keep_last = keep_last
+        self.executor = None
+        self.pending = []
+        # (path, mean score) of the snapshots in save_path, oldest first, only touched by the writer thread once training starts
+        self.snapshots = []
+        self.best = None
+        self.episode_scores = []
+
+    def _init_callback(self):
+        os.makedirs(self.save_path, exist_ok=True)
+        self.snapshots = [(path, None) for _, path in list_snapshots(self.save_path, self.name_prefix)]
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="checkpoint-writer")
+
+    def _on_step(self) -> bool:
+        infos = self.locals["infos"]
+        self.episode_scores.extend(infos[i]["episode_score"] for i in np.flatnonzero(self.locals["dones"]))
+
+        if self.n_calls % self.save_freq == 0:
+            mean_score = float(np.mean(self.episode_scores)) if self.episode_scores else None
+            self.episode_scores = []
+            self._submit(mean_score)
+        return True
+
+    def _on_training_end(self):
+        self.executor.shutdown(wait=True)
+        self._raise_write_errors()
+
+    def _submit(self, mean_score: float):
+        model = self.model
+        exclude = set(model._excluded_save_params())
+        state_dict_names, torch_variable_names = model._get_torch_save_params()
+        exclude.update(name.split(".")[0] for name in state_dict_names + torch_variable_names)
+
+        # Deep copies decouple the snapshot from the live model, which keeps training while the copy is written
+        data = copy.deepcopy({key: value for key, value in model.__dict__.items() if key not in exclude})
+        params = {name: copy.deepcopy(state_dict) for name, state_dict in model.get_parameters().items()}
+        pytorch_variables = {name: copy.deepcopy(recursive_getattr(model, name)) for name in torch_variable_names}
+
+        path = os.path.join(self.save_path, f"{self.name_prefix}_{self.num_timesteps}_steps.zip")
+        self._raise_write_errors()
+        self.pending.append(self.executor.submit(self._write, path, data, params, pytorch_variables, mean_score))
+
+    def _write(self, path: str, data: dict, params: dict, pytorch_variables: dict, mean_score: float):
+        temp_path = path + ".tmp"
+        save_to_zip_file(temp_path, data=data, params=params, pytorch_variables=pytorch_variables)
+        os.replace(temp_path, path)
+        if self.verbose >= 2:
+            print(f"Saving model checkpoint to {path}")
+
+        # A resumed run may write a snapshot over one of its earlier ones
+        self.snapshots = [snapshot for snapshot in self.snapshots if snapshot[0] != path]
+        self.snapshots.append((path, mean_score))
+        if mean_score is not None and (self.best is None or mean_score > self.best[1]):
+            self.best = (path, mean_score)
+        self._prune()
+
+    def _prune(self):
+        keep = {path for path, _ in self.snapshots[max(len(self.snapshots) - self.keep_last, 0):]}
+        if self.best is not None:
+            keep.add(self.best[0])
+
+        for path, _ in self.snapshots:
+            if path not in keep and os.path.exists(path):
+                os.remove(path)
+        self.snapshots = [snapshot for snapshot in self.snapshots if snapshot[0] in keep]
+
+    def _raise_write_errors(self):
+        """Surfaces the exception of any finished write in the training thread"""
+        done = [future for future in self.pending if future.done()]
+        self.pending = [future for future in self.pending if not future.done()]
+        for future in done:
+            future.result()
@@ -0,0 +1,267 @@
+import numpy as np
+
+from gymnasium import spaces
+
+from snake import Orientation
+from envs.obsmodes import FLAT_OBS_MODES, FOV_MODES, OBS_MODES
+from envs.spacefeatures import NUM_SPACE_FEATURES, SpaceFeatures
+
+NUM_FEATURES = 14
+
+# Cell value of walls in field-of-view windows
+WALL = 4
+
+def observation_space_for(grid_num_squares: int, obs_mode: str = "flat", fov_distance: int = 5, space_features: bool = False) -> spaces.Space:
+    """Returns the observation space matching the given observation mode, space_features adding NUM_SPACE_FEATURES features"""
+    num_features = NUM_FEATURES + (NUM_SPACE_FEATURES if space_features else 0)
+    if obs_mode in FOV_MODES:
+        fov_size = 2 * fov_distance + 1
+        return spaces.Box(low=0, high=WALL, shape=(fov_size * fov_size + num_features, ), dtype=np.float32)
+
+    if obs_mode == "flat":
+        return spaces.Box(
+            low=0, # 0 = empty space/wall, 1 = snake part, 2 = snake head, 3 = apple
+            high=3,
+            shape=(grid_num_squares * grid_num_squares + num_features, ), # +2 for apple direction, +4 for wall distances, +4 for current direction, +4 for danger detection
+            dtype=np.float32
+        )
+
+    if obs_mode == "uint8":
+        grid_space = spaces.Box(low=0, high=3, shape=(grid_num_squares, grid_num_squares), dtype=np.uint8)
+    elif obs_mode == "onehot":
+        # Bounded to [0, 1]: use policy_kwargs=dict(normalize_images=False) to feed it to a CNN extractor
+        grid_space = spaces.Box(low=0, high=1, shape=(3, grid_num_squares, grid_num_squares), dtype=np.uint8)
+    elif obs_mode == "packed":
+        num_bytes = (3 * grid_num_squares * grid_num_squares + 7) // 8
+        grid_space = spaces.Box(low=0, high=255, shape=(num_bytes, ), dtype=np.uint8)
+    else:
+        raise ValueError(f"Unknown observation mode {obs_mode}, expected one of {OBS_MODES}")
+
+    return spaces.Dict({
+        "grid": grid_space,
+        # Reachable cell counts go up to the whole board
+        "features": spaces.Box(low=-grid_num_squares, high=grid_num_squares * grid_num_squares if space_features else grid_num_squares,
+                               shape=(num_features, ), dtype=np.float32),
+    })
+
+def encode_grid(grid: np.ndarray, obs_mode: str) -> np.ndarray:
+    """
+    Encodes a grid of cell values (0 = empty, 1 = snake part, 2 = snake head, 3 = apple)
+    of shape (..., n, n) for the given compact observation mode.
+    """
+    if obs_mode == "uint8":
+        return grid.astype(np.uint8)
+
+    onehot = np.stack([grid == 1, grid == 2, grid == 3], axis=-3).astype(np.uint8)
+    if obs_mode == "onehot":
+        return onehot
+
+    return np.packbits(onehot.reshape(onehot.shape[:-3] + (-1, )), axis=-1)
+
+def fill_grid(tgame, grid: np.ndarray) -> np.ndarray:
+    """
+    Paints the cell values of the game (0 = empty, 1 = snake part, 2 = snake head, 3 = apple) into grid.
+    A grid larger than the board is padded with 0, the value shared by empty cells and walls.
+    """
+    tsnake = tgame.tsnake
+    apple_coords = tgame.apple_coords
+    board_size = tgame.grid_num_squares
+
+    if len(grid) > board_size:
+        grid[board_size:] = 0
+        grid[:board_size, board_size:] = 0
+    np.minimum(tsnake.occupancy, 1, out=grid[:board_size, :board_size], casting="unsafe")
+    grid[tsnake.head_y, tsnake.head_x] = 2
+    if apple_coords is not None:
+        grid[apple_coords[1], apple_coords[0]] = 3
+    return grid
+
+class ObservationBuilder:
+    """
+    Builds SnakeEnv observations into preallocated buffers.
+
+    The grid holds 0 = empty, 1 = snake part, 2 = snake head, 3 = apple and is followed by
+    14 features: apple direction (2), wall distances (4), current direction (4) and danger detection (4).
+    The flat mode keeps both in a single float32 buffer, compact modes are encoded from a uint8 grid.
+
+    In incremental mode only the grid cells that can change between two steps
+    (previous/current head, previous tail and previous/current apple) are repainted.
+
+    view_size fixes the grid size independently of the board (default: the board size), so one policy
+    can play boards of several sizes: smaller boards are padded with 0 and wall distances are those of the board.
+
+    Field-of-view modes keep the board in a grid padded with fov_distance walls on each side, always updated
+    incrementally, and observe the slice of it centered on the head: their cost does not depend on the board size.
+
+    space_features appends the reachable cells after each move and the path length to the apple, see envs.spacefeatures.
+    """
+
+    def __init__(self, tgame, incremental: bool = False, copy: bool = True, check: bool = False, obs_mode: str = "flat", view_size: int = None, space_features: bool = False):
+        if obs_mode not in OBS_MODES:
+            raise ValueError(f"Unknown observation mode {obs_mode}, expected one of {OBS_MODES}")
+
+        self.tgame = tgame
+        self.space_features = SpaceFeatures(tgame) if space_features else None
+        self.num_features = NUM_FEATURES + (NUM_SPACE_FEATURES if space_features else 0)
+        self.incremental = incremental
+        self.copy = copy
+        self.check = check
+        self.obs_mode = obs_mode
+
+        self.view_size = view_size or tgame.grid_num_squares
+        self.grid_len = self.view_size * self.view_size
+
+        self.fov = obs_mode in FOV_MODES
+        if self.fov:
+            self.fov_distance = tgame.fov_distance
+            self.fov_size = 2 * self.fov_distance + 1
+            self.obs, _, self.features = self._new_buffers()
+            self._new_padded_grid()
+        else:
+            self.obs, self.grid, self.features = self._new_buffers()
+
+        self.needs_full_build = True
+        self.prev_cells = ()
+
+    def _new_buffers(self) -> tuple:
+        """Returns (flat observation or None, grid, features) buffers for the observation mode"""
+        if self.fov:
+            fov_len = self.fov_size * self.fov_size
+            obs = np.zeros(fov_len + self.num_features, dtype=np.float32)
+            grid_num_squares = self.tgame.grid_num_squares
+            return obs, np.zeros((grid_num_squares, grid_num_squares), dtype=np.uint8), obs[fov_len:]
+
+        if self.obs_mode == "flat":
+            obs = np.zeros(self.grid_len + self.num_features, dtype=np.float32)
+            return obs, obs[:self.grid_len].reshape(self.view_size, self.view_size), obs[self.grid_len:]
+
+        grid = np.zeros((self.view_size, self.view_size), dtype=np.uint8)
+        return None, grid, np.zeros(self.num_features, dtype=np.float32)
+
+    def _new_padded_grid(self):
+        """Allocates the wall-padded grid of field-of-view modes for the current board size, self.grid is its inside"""
+        f = self.fov_distance
+        grid_num_squares = self.tgame.grid_num_squares
+        self.padded_grid = np.full((grid_num_squares + 2 * f, grid_num_squares + 2 * f), WALL, dtype=np.uint8)
+        self.grid = self.padded_grid[f:f + grid_num_squares, f:f + grid_num_squares]
+
+    def _write_fov_window(self):
+        """Copies the window of the padded grid centered on the head into the observation, rotated if requested"""
+        tsnake = self.tgame.tsnake
+        window = self.padded_grid[tsnake.head_y:tsnake.head_y + self.fov_size, tsnake.head_x:tsnake.head_x + self.fov_size]
+        if self.obs_mode == "fov_rotated":
+            # Turns the head's direction to the top row
+            window = np.rot90(window, tsnake.head_orientation.value)
+        self.obs[:self.fov_size * self.fov_size].reshape(self.fov_size, self.fov_size)[:] = window
+
+    def _encode(self, obs: np.ndarray, grid: np.ndarray, features: np.ndarray, copy: bool):
+        if self.obs_mode in FLAT_OBS_MODES:
+            return obs.copy() if copy else obs
+
+        if self.obs_mode == "uint8" and copy:
+            grid = grid.copy()
+        elif self.obs_mode != "uint8":
+            grid = encode_grid(grid, self.obs_mode)
+
+        return {"grid": grid, "features": features.copy() if copy else features}
+
+    def reset(self):
+        """Forces a full rebuild on the next call to build, e.g. after the game was reset"""
+        self.needs_full_build = True
+
+    def build(self):
+        """
+        Returns the observation for the current game state.
+        When copy is False the internal buffers are returned and are overwritten by the next build.
+        """
+        if not self.incremental and not self.fov:
+            obs, grid, features = self._new_buffers()
+            self.build_full(grid, features)
+            return self._encode(obs, grid, features, copy=False)
+
+        if self.needs_full_build:
+            if self.fov and len(self.grid) != self.tgame.grid_num_squares:
+                self._new_padded_grid()
+            self.build_full(self.grid, self.features)
+            self.needs_full_build = False
+        else:
+            self._patch_grid()
+            self._write_features(self.features)
+
+        self._remember_cells()
+
+        if self.check:
+            _, expected_grid, expected_features = self._new_buffers()
+            self.build_full(expected_grid, expected_features)
+            if not np.array_equal(expected_grid, self.grid) or not np.array_equal(expected_features, self.features):
+                mismatch = np.flatnonzero(np.concatenate([(expected_grid != self.grid).ravel(), expected_features != self.features]))
+                raise RuntimeError(f"Incremental observation differs from full rebuild at indices {mismatch.tolist()}")
+
+        if self.fov:
+            self._write_fov_window()
+
+        return self._encode(self.obs, self.grid, self.features, copy=self.copy)
+
+    def build_full(self, grid: np.ndarray, features: np.ndarray):
+        """Rebuilds the whole grid and the features into the given buffers"""
+        fill_grid(self.tgame, grid)
+        self._write_features(features)
+
+    def _cell_value(self, x: int, y: int) -> int:
+        if (x, y) == self.tgame.apple_coords:
+            return 3
+        tsnake = self.tgame.tsnake
+        if x == tsnake.head_x and y == tsnake.head_y:
+            return 2
+        if tsnake.is_part_at(x, y):
+            return 1
+        return 0
+
+    def _current_cells(self) -> tuple:
+        tsnake = self.tgame.tsnake
+        if self.tgame.apple_coords is None:
+            return ((tsnake.head_x, tsnake.head_y), tsnake.snake_parts[0])
+        return ((tsnake.head_x, tsnake.head_y), tsnake.snake_parts[0], self.tgame.apple_coords)
+
+    def _remember_cells(self):
+        self.prev_cells = self._current_cells()
+
+    def _patch_grid(self):
+        grid = self.grid
+        for x, y in set(self.prev_cells + self._current_cells()):
+            grid[y, x] = self._cell_value(x, y)
+
+    def _write_features(self, out: np.ndarray):
+        tsnake = self.tgame.tsnake
+        last = self.tgame.grid_num_squares - 1
+        head_x = tsnake.head_x
+        head_y = tsnake.head_y
+        apple_coords = self.tgame.apple_coords
+        orientation = tsnake.head_orientation.value
+
+        # Features are gathered in Python and written with a single slice assignment,
+        # per-element writes into the float32 buffer cost more than the whole grid update
+        out[:NUM_FEATURES] = (
+            # Direction to apple, zero once the board is full
+            0 if apple_coords is None else apple_coords[0] - head_x,
+            0 if apple_coords is None else apple_coords[1] - head_y,
+            # Distance to walls (top, right, bottom, left)
+            head_y,
+            last - head_x,
+            last - head_y,
+            head_x,
+            # One-hot encoding of current direction
+            orientation == Orientation.UP.value,
+            orientation == Orientation.RIGHT.value,
+            orientation == Orientation.DOWN.value,
+            orientation == Orientation.LEFT.value,
+            # Danger for each possible direction: out of bounds or part of the snake's body
+            head_y == 0 or tsnake.is_part_at(head_x, head_y - 1),
+            head_x == last or tsnake.is_part_at(head_x + 1, head_y),
+            head_y == last or tsnake.is_part_at(head_x, head_y + 1),
+            head_x == 0 or tsnake.is_part_at(head_x - 1, head_y),
+        )
+
+        # Cached per state, so the full rebuild checking an incremental one does not flood again
+        if self.space_features is not None:
+            out[NUM_FEATURES:] = self.space_features.compute()
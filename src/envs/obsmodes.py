@@ -0,0 +1,14 @@
+# Kept apart from envs.observation so that the command line can list the modes without loading NumPy or gymnasium
+
+# "flat": float32 vector of the grid followed by the features, as originally used for MlpPolicy
+# "uint8": uint8 (n, n) grid of cell values
+# "onehot": channels-first uint8 (3, n, n) body/head/apple planes, for CNN policies
+# "packed": the one-hot planes bit-packed into uint8 bytes
+# "fov": float32 vector of the (2 * fov_distance + 1)^2 cells around the head followed by the features,
+#        cells beyond the board are walls (4)
+# "fov_rotated": the same window rotated so the head faces up; features stay in board coordinates
+# Compact modes are Dict observations {"grid": ..., "features": ...} for MultiInputPolicy.
+OBS_MODES = ("flat", "uint8", "onehot", "packed", "fov", "fov_rotated")
+FOV_MODES = ("fov", "fov_rotated")
+# Modes observed as a single float32 vector, for MlpPolicy
+FLAT_OBS_MODES = ("flat", ) + FOV_MODES
@@ -0,0 +1,13 @@
+from stable_baselines3.common.vec_env import VecEnv
+
+from envs.vec_snake_env import VecSnakeEnv
+
+class SB3VecSnakeEnv(VecSnakeEnv, VecEnv):
+    """
+    VecSnakeEnv as a stable_baselines3 VecEnv, which algorithms require of the vectorized envs they train on.
+    VecSnakeEnv implements the VecEnv API itself, the base class only adds its wrappers' helpers.
+    """
+
+    def __init__(self, *args, **kwargs):
+        VecSnakeEnv.__init__(self, *args, **kwargs)
+        VecEnv.__init__(self, self.num_envs, self.observation_space, self.action_space)
@@ -0,0 +1,178 @@
+import multiprocessing as mp
+
+import numpy as np
+
+from gymnasium import spaces
+from stable_baselines3.common.vec_env import VecEnv
+
+from envs.shm_worker import CloudpickleWrapper, as_array, worker
+
+def _shared_array(ctx, shape: tuple, dtype) -> tuple:
+    """Allocates a shared buffer and returns it with a NumPy view over it"""
+    dtype = np.dtype(dtype)
+    raw = ctx.RawArray("B", max(int(np.prod(shape)) * dtype.itemsize, 1))
+    return raw, as_array(raw, shape, dtype)
+
+def _obs_subspaces(observation_space: spaces.Space) -> dict:
+    """Maps each observation key to its Box space, None being the key of a plain Box observation"""
+    if isinstance(observation_space, spaces.Dict):
+        subspaces = dict(observation_space.spaces)
+    else:
+        subspaces = {None: observation_space}
+
+    for key, subspace in subspaces.items():
+        if not isinstance(subspace, spaces.Box):
+            raise ValueError(f"SharedMemoryVecEnv only supports Box and Dict of Box observation spaces, got {subspace} for key {key}")
+    return subspaces
+
+def _read_obs(buffers: dict, index=slice(None)):
+    if None in buffers:
+        return buffers[None][index].copy()
+    return {key: buffer[index].copy() for key, buffer in buffers.items()}
+
+class SharedMemoryVecEnv(VecEnv):
+    """
+    Subprocess vectorized env that exchanges step data through shared memory instead of pickling it.
+
+    Workers write observations, rewards, done flags and the numeric info entries listed in info_keys
+    straight into shared NumPy buffers; pipes only carry the command and an empty acknowledgement.
+    Actions are written to a shared buffer by the parent before each step.
+
+    Box and Dict of Box observation spaces are supported.
+    Envs with an action_masks method and a Discrete action space also write their legal actions to a shared buffer
+    after every step and reset, read as one (N, n) array by action_masks.
+    """
+
+    def __init__(self, env_fns: list, info_keys: tuple = ("score", "steps", "episode_score"), start_method: str = None):
+        self.waiting = False
+        self.closed = False
+        self.info_keys = tuple(info_keys)
+        n_envs = len(env_fns)
+
+        # The spaces size the shared buffers, so they are probed in the parent before starting the workers
+        probe_env = env_fns[0]()
+        observation_space, action_space = probe_env.observation_space, probe_env.action_space
+        has_action_masks = hasattr(probe_env, "action_masks") and isinstance(action_space, spaces.Discrete)
+        probe_env.close()
+
+        obs_subspaces = _obs_subspaces(observation_space)
+
+        if start_method is None:
+            forkserver_available = "forkserver" in mp.get_all_start_methods()
+            start_method = "forkserver" if forkserver_available else "spawn"
+        ctx = mp.get_context(start_method)
+
+        self.layout = {}
+        for key, subspace in obs_subspaces.items():
+            self.layout[("obs", key)] = ((n_envs, ) + subspace.shape, subspace.dtype)
+            self.layout[("terminal_obs", key)] = ((n_envs, ) + subspace.shape, subspace.dtype)
+        self.layout.update({
+            "actions": ((n_envs, ) + action_space.shape, action_space.dtype),
+            "rewards": ((n_envs, ), np.float32),
+            "dones": ((n_envs, ), np.bool_),
+            "truncations": ((n_envs, ), np.bool_),
+            "infos": ((n_envs, len(self.info_keys)), np.int64),
+        })
+        if has_action_masks:
+            self.layout["action_masks"] = ((n_envs, int(action_space.n)), np.bool_)
+        self.buffers = {}
+        self.arrays = {}
+        for name, (shape, dtype) in self.layout.items():
+            self.buffers[name], self.arrays[name] = _shared_array(ctx, shape, dtype)
+        self.obs_buffers = {key: self.arrays[("obs", key)] for key in obs_subspaces}
+        self.terminal_obs_buffers = {key: self.arrays[("terminal_obs", key)] for key in obs_subspaces}
+
+        self.remotes, self.work_remotes = zip(*[ctx.Pipe() for _ in range(n_envs)])
+        self.processes = []
+        for index, (work_remote, remote, env_fn) in enumerate(zip(self.work_remotes, self.remotes, env_fns)):
+            args = (work_remote, remote, CloudpickleWrapper(env_fn), index, self.buffers, self.layout, list(obs_subspaces), self.info_keys)
+            # daemon=True: if the main process crashes, we should not cause things to hang
+            process = ctx.Process(target=worker, args=args, daemon=True)
+            process.start()
+            self.processes.append(process)
+            work_remote.close()
+
+        super().__init__(n_envs, observation_space, action_space)
+
+    def step_async(self, actions: np.ndarray):
+        self.arrays["actions"][...] = np.asarray(actions).reshape(self.arrays["actions"].shape)
+        for remote in self.remotes:
+            remote.send(("step", None))
+        self.waiting = True
+
+    def step_wait(self):
+        for remote in self.remotes:
+            remote.recv()
+        self.waiting = False
+
+        dones = self.arrays["dones"].copy()
+        infos = [dict(zip(self.info_keys, values)) for values in self.arrays["infos"].tolist()]
+        for info, truncated in zip(infos, self.arrays["truncations"].tolist()):
+            info["TimeLimit.truncated"] = truncated
+        for i in np.flatnonzero(dones):
+            infos[i]["terminal_observation"] = _read_obs(self.terminal_obs_buffers, i)
+
+        return _read_obs(self.obs_buffers), self.arrays["rewards"].copy(), dones, infos
+
+    def reset(self):
+        for env_idx, remote in enumerate(self.remotes):
+            remote.send(("reset", (self._seeds[env_idx], self._options[env_idx])))
+        self.reset_infos = [remote.recv() for remote in self.remotes]
+
+        # Seeds and options are only used once
+        self._reset_seeds()
+        self._reset_options()
+        return _read_obs(self.obs_buffers)
+
+    def close(self):
+        if self.closed:
+            return
+        if self.waiting:
+            for remote in self.remotes:
+                remote.recv()
+        for remote in self.remotes:
+            remote.send(("close", None))
+        for process in self.processes:
+            process.join()
+        self.closed = True
+
+    def get_images(self):
+        for remote in self.remotes:
+            remote.send(("render", None))
+        return [remote.recv() for remote in self.remotes]
+
+    def get_attr(self, attr_name: str, indices=None):
+        target_remotes = self._get_target_remotes(indices)
+        for remote in target_remotes:
+            remote.send(("get_attr", attr_name))
+        return [remote.recv() for remote in target_remotes]
+
+    def set_attr(self, attr_name: str, value, indices=None):
+        target_remotes = self._get_target_remotes(indices)
+        for remote in target_remotes:
+            remote.send(("set_attr", (attr_name, value)))
+        for remote in target_remotes:
+            remote.recv()
+
+    def action_masks(self) -> np.ndarray:
+        """Returns the legal actions of every env after the last step or reset, without a round trip to the workers"""
+        if "action_masks" not in self.arrays:
+            raise AttributeError("The envs have no action_masks method")
+        return self.arrays["action_masks"].copy()
+
+    def env_method(self, method_name: str, *method_args, indices=None, **method_kwargs):
+        if method_name == "action_masks" and "action_masks" in self.arrays:
+            return list(self.action_masks()[self._get_indices(indices)])
+        target_remotes = self._get_target_remotes(indices)
+        for remote in target_remotes:
+            remote.send(("env_method", (method_name, method_args, method_kwargs)))
+        return [remote.recv() for remote in target_remotes]
+
+    def env_is_wrapped(self, wrapper_class, indices=None):
+        target_remotes = self._get_target_remotes(indices)
+        for remote in target_remotes:
+            remote.send(("is_wrapped", wrapper_class))
+        return [remote.recv() for remote in target_remotes]
+
+    def _get_target_remotes(self, indices) -> list:
+        return [self.remotes[i] for i in self._get_indices(indices)]
@@ -0,0 +1,94 @@
+import cloudpickle
+import numpy as np
+
+# Runs in the SharedMemoryVecEnv subprocesses, which import this module to start: it stays clear of
+# stable_baselines3 and torch so that workers only load what their env needs.
+
+class CloudpickleWrapper:
+    """Pickles the env constructor with cloudpickle, so that lambdas and closures reach the workers"""
+
+    def __init__(self, var):
+        self.var = var
+
+    def __getstate__(self):
+        return cloudpickle.dumps(self.var)
+
+    def __setstate__(self, var):
+        self.var = cloudpickle.loads(var)
+
+def as_array(raw, shape: tuple, dtype) -> np.ndarray:
+    dtype = np.dtype(dtype)
+    return np.frombuffer(raw, dtype=dtype, count=int(np.prod(shape))).reshape(shape)
+
+def write_obs(buffers: dict, index: int, observation):
+    if None in buffers:
+        buffers[None][index] = observation
+    else:
+        for key, buffer in buffers.items():
+            buffer[index] = observation[key]
+
+def worker(remote, parent_remote, env_fn_wrapper: CloudpickleWrapper, index: int, buffers: dict, layout: dict, obs_keys: list, info_keys: tuple):
+    parent_remote.close()
+    env = env_fn_wrapper.var()
+
+    arrays = {name: as_array(buffers[name], *layout[name]) for name in buffers}
+    obs = {key: arrays[("obs", key)] for key in obs_keys}
+    terminal_obs = {key: arrays[("terminal_obs", key)] for key in obs_keys}
+    actions = arrays["actions"]
+    rewards = arrays["rewards"]
+    dones = arrays["dones"]
+    truncations = arrays["truncations"]
+    infos = arrays["infos"][index]
+    action_masks = arrays.get("action_masks")
+
+    def write_info(info: dict):
+        for k, key in enumerate(info_keys):
+            infos[k] = info.get(key, 0)
+
+    while True:
+        try:
+            cmd, data = remote.recv()
+            if cmd == "step":
+                observation, reward, terminated, truncated, info = env.step(actions[index])
+                done = terminated or truncated
+                rewards[index] = reward
+                dones[index] = done
+                truncations[index] = truncated and not terminated
+                write_info(info)
+                if done:
+                    # save final observation where the parent can get it, then reset
+                    write_obs(terminal_obs, index, observation)
+                    observation, _ = env.reset()
+                write_obs(obs, index, observation)
+                if action_masks is not None:
+                    action_masks[index] = env.action_masks()
+                remote.send(None)
+            elif cmd == "reset":
+                maybe_options = {"options": data[1]} if data[1] else {}
+                observation, reset_info = env.reset(seed=data[0], **maybe_options)
+                write_obs(obs, index, observation)
+                if action_masks is not None:
+                    action_masks[index] = env.action_masks()
+                remote.send(reset_info)
+            elif cmd == "render":
+                remote.send(env.render())
+            elif cmd == "close":
+                env.close()
+                remote.close()
+                break
+            elif cmd == "env_method":
+                method = getattr(env, data[0])
+                remote.send(method(*data[1], **data[2]))
+            elif cmd == "get_attr":
+                remote.send(getattr(env, data))
+            elif cmd == "set_attr":
+                remote.send(setattr(env, data[0], data[1]))
+            elif cmd == "is_wrapped":
+                from stable_baselines3.common.env_util import is_wrapped
+                remote.send(is_wrapped(env, data))
+            else:
+                raise NotImplementedError(f"`{cmd}` is not implemented in the worker")
+        except EOFError:
+            break
+        except KeyboardInterrupt:
+            break
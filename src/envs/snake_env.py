@@ -5,13 +5,33 @@ from gymnasium import spaces
 
 from snake import Orientation, TSnake
 from game import TGame
+from envs.observation import ObservationBuilder, fill_grid, observation_space_for
+from framebuffer import FrameRenderer
+from profiler import PhaseProfiler
 
 class SnakeEnv(gym.Env):
-    metadata = {"render_modes": ["human"]}
+    metadata = {"render_modes": ["human", "rgb_array"]}
 
-    def __init__(self, game_name: str, grid_size_pixels: int, grid_num_squares: int, framerate: int, inputs_enabled: bool, rendering_enabled:bool, debug=False):
+    def __init__(self, game_name: str, grid_size_pixels: int, grid_num_squares: int, framerate: int, inputs_enabled: bool, rendering_enabled:bool, debug=False, incremental_observation: bool = False, copy_observation: bool = True, obs_mode: str = "flat", render_mode: str = None, profile: bool = False, view_size: int = None, record_path: str = None, mask_collisions: bool = False, space_features: bool = False, step_kernel: bool = False):
         """
         Initialize the Snake environment.
+
+        incremental_observation patches a preallocated observation buffer instead of rebuilding it every step,
+        and copy_observation=False returns that buffer without copying it (it is overwritten by the next step).
+        In debug mode, incremental observations are checked against a full rebuild.
+        obs_mode selects the observation encoding, see envs.observation.OBS_MODES.
+        render_mode="rgb_array" makes render return (H, W, 3) frames painted from the game state, without pygame;
+        rendering_enabled implies render_mode="human".
+        profile times every step phase (step, action, collision, apple spawn, observation, render), see get_stats.
+        view_size fixes the observed grid size so the board can be resized with set_grid_num_squares (default: the board size).
+        Field-of-view modes observe the cells within tgame.fov_distance of the head instead, whatever the board size.
+        record_path appends every episode to a replay file, see replay.EpisodeRecorder.
+        The info of the last step of an episode gives its final score as info["episode_score"].
+        The legal actions of every state are given by action_masks and info["action_mask"]: reversals are masked,
+        and with mask_collisions so are moves into a wall or the body.
+        space_features appends the reachable cells after each move and the path length to the apple to the features.
+        step_kernel steps headless games with stepkernel.TKernelGame on integer-coded state arrays instead of TGame.
+        Headless envs accept any grid_size_pixels; it only sizes rgb_array frames and the window.
         """
 
         self.reward_move = -0.01
@@ -22,20 +42,50 @@ class SnakeEnv(gym.Env):
 
         self.steps_count = 0
         self.steps_max = 1000
+        self.mask_collisions = mask_collisions
 
         self.action_space = spaces.Discrete(4) # "Up", "Right", "Down", "Left"
 
-        # Update observation space to include multiple frames
-        self.observation_space = spaces.Box(
-            low=0, # 0 = empty space/wall, 1 = snake part, 2 = snake head, 3 = apple
-            high=3,
-            shape=(grid_num_squares * grid_num_squares + 14, ), # +2 for apple direction, +4 for wall distances, +4 for current direction, +4 for danger detection
-            dtype=np.float32
-        )
+        self.view_size = view_size or grid_num_squares
+        if grid_num_squares > self.view_size:
+            raise ValueError(f"Board of {grid_num_squares} squares does not fit the observed view of {self.view_size} squares.")
+        self.next_grid_num_squares = grid_num_squares
 
-        self.tgame = TGame.initialize(game_name, grid_size_pixels, grid_num_squares, framerate, inputs_enabled, rendering_enabled, debug)
+        if step_kernel:
+            if inputs_enabled or rendering_enabled:
+                raise ValueError("The step kernel only runs headless games.")
+            from stepkernel import TKernelGame
+            self.tgame = TKernelGame.initialize(game_name, grid_num_squares, debug, rng=self.np_random)
+        else:
+            self.tgame = TGame.initialize(game_name, grid_size_pixels, grid_num_squares, framerate, inputs_enabled, rendering_enabled, debug, rng=self.np_random)
+        self.observation_space = observation_space_for(self.view_size, obs_mode, self.tgame.fov_distance, space_features)
+        self.render_mode = "human" if rendering_enabled else render_mode
+        self.frame_renderer = None
+        if self.render_mode == "rgb_array":
+            self.frame_renderer = FrameRenderer(self.view_size, max(grid_size_pixels // self.view_size, 1))
+            self.frame_grid = np.zeros((self.view_size, self.view_size), dtype=np.uint8)
+
+        self.observation_builder = ObservationBuilder(self.tgame, incremental=incremental_observation, copy=copy_observation, check=debug, obs_mode=obs_mode, view_size=self.view_size, space_features=space_features)
+
+        if record_path is not None:
+            from replay import EpisodeRecorder
+            self.tgame.enable_recording(EpisodeRecorder(record_path))
+
+        # Phases are only wrapped with timers when profiling, so unprofiled envs run unchanged
+        self.profiler = None
+        if profile:
+            self.profiler = PhaseProfiler()
+            self.tgame.enable_profiling(self.profiler)
+            self.profiler.instrument(self, "step", "step")
+            self.profiler.instrument(self, "reset", "reset")
+            self.profiler.instrument(self, "_get_observation", "observation")
+            if self.frame_renderer is not None:
+                self.profiler.instrument(self.frame_renderer, "render", "render")
 
     def render(self):
+        if self.render_mode == "rgb_array":
+            return self.frame_renderer.render(fill_grid(self.tgame, self.frame_grid))
+
         self.tgame.inputctrl.change_gamestate_input_events()
 
         self.tgame.renderer.render_all()
@@ -45,11 +95,12 @@ class SnakeEnv(gym.Env):
         previous_score = self.tgame.score
         action_possible = self.tgame.perform_action(Orientation(action))
 
-        terminated = not self.tgame.tsnake.is_alive
+        # A full board leaves no room for an apple and ends the episode as a win
+        terminated = not self.tgame.tsnake.is_alive or self.tgame.is_won
         truncated = self.steps_count >= self.steps_max
 
         reward = 0
-        if terminated:
+        if not self.tgame.tsnake.is_alive:
             reward = self.reward_collision
         elif previous_score != self.tgame.score:
             reward = self.reward_apple
@@ -63,90 +114,54 @@ class SnakeEnv(gym.Env):
         # Create info dict for debugging
         info = {
             "score": self.tgame.score,
-            "steps": self.steps_count
+            "steps": self.steps_count,
+            "action_mask": self.action_masks()
         }
+        if terminated or truncated:
+            # The score drops to 0 when the snake dies, which it cannot do while eating
+            info["episode_score"] = self.tgame.score if self.tgame.tsnake.is_alive else previous_score
         
         return observation, reward, terminated, truncated, info
         
     def _get_observation(self):
-        # Create empty grid filled with zeros
-        current_grid = np.zeros((self.tgame.grid_num_squares, self.tgame.grid_num_squares), dtype=np.int32)
-
-        # Add snake body parts (value 1)
-        for part in self.tgame.tsnake.snake_parts:
-            current_grid[part[1]][part[0]] = 1
-
-        # Add snake head (value 2)
-        current_grid[self.tgame.tsnake.head_y][self.tgame.tsnake.head_x] = 2
-
-        # Add apple (value 3)
-        current_grid[self.tgame.apple_coords[1]][self.tgame.apple_coords[0]] = 3
-
-        # Add direction to apple
-        apple_direction = np.array([
-            self.tgame.apple_coords[0] - self.tgame.tsnake.head_x,
-            self.tgame.apple_coords[1] - self.tgame.tsnake.head_y,
-        ])
-
-        # Add distance to walls
-        wall_distances = np.array([
-            self.tgame.tsnake.head_y,  # Distance to top
-            self.tgame.grid_num_squares - self.tgame.tsnake.head_x - 1,  # Distance to right
-            self.tgame.grid_num_squares - self.tgame.tsnake.head_y - 1,  # Distance to bottom
-            self.tgame.tsnake.head_x  # Distance to left
-        ])
-
-        # Add current direction
-        current_direction = np.zeros(4)  # one-hot encoding of direction
-        current_direction[self.tgame.tsnake.head_orientation.value] = 1
-
-        # Add danger detection for each possible direction (up, right, down, left)
-        danger = np.zeros(4)
-        for direction in range(4):
-            next_x = self.tgame.tsnake.head_x
-            next_y = self.tgame.tsnake.head_y
-            
-            if direction == Orientation.UP.value:
-                next_y -= 1
-            elif direction == Orientation.RIGHT.value:
-                next_x += 1
-            elif direction == Orientation.DOWN.value:
-                next_y += 1
-            elif direction == Orientation.LEFT.value:
-                next_x -= 1
-                
-            # Mark as dangerous if next position is:
-            # 1. Out of bounds
-            # 2. Part of snake's body
-            danger[direction] = (
-                next_x < 0 or 
-                next_x >= self.tgame.grid_num_squares or
-                next_y < 0 or 
-                next_y >= self.tgame.grid_num_squares or
-                (next_x, next_y) in self.tgame.tsnake.snake_parts
-            )
-
-        obs = np.concatenate([
-            current_grid.flatten(),
-            apple_direction,
-            wall_distances,
-            current_direction,
-            danger
-        ])
-
-        return obs
+        return self.observation_builder.build()
 
     def reset(self, seed=None, options=None):
         super().reset(seed=seed)  # Reset the RNG if provided
+        self.tgame.set_rng(self.np_random)  # Apples are drawn from the env's own, seedable RNG
+        self.tgame.grid_num_squares = self.next_grid_num_squares
         self.tgame.reset()
+        self.observation_builder.reset()
         self.steps_count = 0
 
         observation = self._get_observation()
-        info = {"score": 0, "steps": 0}
+        info = {"score": 0, "steps": 0, "action_mask": self.action_masks()}
 
         return observation, info
 
+    def action_masks(self) -> np.ndarray:
+        """Returns the legal actions of the current state as 4 booleans indexed by action, as used by maskable policies"""
+        return self.tgame.action_mask(self.mask_collisions)
+
     
+    def set_grid_num_squares(self, grid_num_squares: int):
+        """Resizes the board of headless games from the next reset on, within the observed view"""
+        if grid_num_squares > self.view_size:
+            raise ValueError(f"Board of {grid_num_squares} squares does not fit the observed view of {self.view_size} squares.")
+        if self.render_mode == "human":
+            raise ValueError("The board of a rendered game cannot be resized.")
+        self.next_grid_num_squares = grid_num_squares
+
+    def get_stats(self) -> dict:
+        """Returns the phase timings recorded since the last reset_stats, empty when profiling is disabled"""
+        if self.profiler is None:
+            return {}
+        return self.profiler.get_stats()
+
+    def reset_stats(self):
+        if self.profiler is not None:
+            self.profiler.reset()
+
     def close(self):
         self.tgame.set_terminated(True)
         self.tgame.close()
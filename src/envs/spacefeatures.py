@@ -0,0 +1,122 @@
+import numpy as np
+
+# Reachable cells after each move (up, right, down, left), then the path length to the apple
+NUM_SPACE_FEATURES = 5
+
+def flood(region: int, free: int, stride: int) -> int:
+    """Grows the bitboard region through the free cells until it stops changing, rows being stride bits apart"""
+    while True:
+        grown = region | ((region << 1 | region >> 1 | region << stride | region >> stride) & free)
+        if grown == region:
+            return region
+        region = grown
+
+def path_length(start: int, target: int, free: int, stride: int) -> int:
+    """Returns the number of moves from the start bit to the target bit through the free cells, -1 if unreachable"""
+    region = start
+    length = 0
+    while not region & target:
+        grown = region | ((region << 1 | region >> 1 | region << stride | region >> stride) & free)
+        if grown == region:
+            return -1
+        region = grown
+        length += 1
+    return length
+
+def space_features(free: int, stride: int, head: int, tail: int, apple: int) -> tuple:
+    """
+    Returns the space features of a board given as the bitboard of the cells free after a move, rows being stride bits
+    apart with blocked bits between them, and the bit indices of the head, the tail and the apple (-1 without one).
+    The tail cell may be free after the move but still blocks it. Moves into the same region share its fill.
+    """
+    reachable = [0, 0, 0, 0]
+    regions = []
+    for value, cell in enumerate((head - stride, head + 1, head + stride, head - 1)):
+        # Walls are blocked bits: the guard bits between rows and the bits beyond the board
+        if cell < 0 or cell == tail or not (free >> cell) & 1:
+            continue
+
+        bit = 1 << cell
+        region = next((r for r in regions if r & bit), None)
+        if region is None:
+            region = flood(bit, free, stride)
+            regions.append(region)
+        reachable[value] = region.bit_count()
+
+    distance = -1 if apple < 0 else path_length(1 << head, 1 << apple, free, stride)
+    return (*reachable, distance)
+
+class SpaceFeatures:
+    """
+    Reachable-space features of a TGameCore state, for a snake to see the regions it is about to close off.
+
+    For each move: the number of cells reachable from the cell the head enters on the board after the move,
+    that cell included, or 0 for a deadly move. Then the length of the shortest path from the head to the apple,
+    -1 without a path or an apple. After a move the old head is body and the tail cell is free
+    (unless a grown snake holds it twice), and both features are measured on that board.
+
+    Cells are bits of Python ints, one row of grid_num_squares bits plus a blocked guard bit after another,
+    so a flood fill step is four shifts and a mask over the whole board.
+    Results are cached for the last state, keyed on its free-cell bitboard, head, tail and apple.
+    """
+
+    def __init__(self, tgame):
+        self.tgame = tgame
+        self.free_buffer = None
+        self.key = None
+        self.values = (0, ) * NUM_SPACE_FEATURES
+
+    def compute(self) -> tuple:
+        """Returns the features of the current state"""
+        tgame = self.tgame
+        tsnake = tgame.tsnake
+        g = tgame.grid_num_squares
+        stride = g + 1
+
+        # Free cells after any move: the old head becomes body and a tail held once is freed
+        if self.free_buffer is None or len(self.free_buffer) != g:
+            self.free_buffer = np.zeros((g, stride), dtype=bool)
+        np.logical_not(tsnake.occupancy, out=self.free_buffer[:, :g])
+        self.free_buffer[tsnake.head_y, tsnake.head_x] = False
+        tail_x, tail_y = tsnake.snake_parts[0]
+        if tsnake.occupancy.item(tail_y, tail_x) == 1:
+            self.free_buffer[tail_y, tail_x] = True
+        free = int.from_bytes(np.packbits(self.free_buffer, bitorder="little").tobytes(), "little")
+
+        head = tsnake.head_y * stride + tsnake.head_x
+        tail = tail_y * stride + tail_x
+        apple = -1 if tgame.apple_coords is None else tgame.apple_coords[1] * stride + tgame.apple_coords[0]
+        key = (free, head, tail, apple)
+        if key != self.key:
+            self.key = key
+            self.values = space_features(free, stride, head, tail, apple)
+        return self.values
+
+def batch_space_features(occupancy: np.ndarray, board_size: np.ndarray, head_x: np.ndarray, head_y: np.ndarray,
+                         tail_x: np.ndarray, tail_y: np.ndarray, apple_x: np.ndarray, apple_y: np.ndarray) -> np.ndarray:
+    """
+    Returns the space features of a batch of games as an (n, NUM_SPACE_FEATURES) array, from their (n, g, g)
+    occupancy grids, board sizes within g, head and tail cells and apple cells (-1 without an apple).
+    The bitboards of all games are built at once, then flooded one game at a time.
+    """
+    n, g, _ = occupancy.shape
+    stride = g + 1
+    rows = np.arange(n)
+
+    # Free cells after any move, the cells beyond each board and the guard column being blocked
+    cells = np.arange(g)
+    free = np.zeros((n, g, stride), dtype=bool)
+    free[:, :, :g] = (occupancy == 0) & (cells[None, :, None] < board_size[:, None, None]) \
+        & (cells[None, None, :] < board_size[:, None, None])
+    free[rows, head_y, head_x] = False
+    free[rows, tail_y, tail_x] |= occupancy[rows, tail_y, tail_x] == 1
+    packed = np.packbits(free.reshape(n, g * stride), axis=1, bitorder="little")
+
+    heads = (head_y * stride + head_x).tolist()
+    tails = (tail_y * stride + tail_x).tolist()
+    apples = np.where(apple_x >= 0, apple_y * stride + apple_x, -1).tolist()
+    features = np.empty((n, NUM_SPACE_FEATURES), dtype=np.float32)
+    for i in range(n):
+        free_bits = int.from_bytes(packed[i].tobytes(), "little")
+        features[i] = space_features(free_bits, stride, heads[i], tails[i], apples[i])
+    return features
@@ -0,0 +1,443 @@
+import numpy as np
+
+from gymnasium import spaces
+
+from envs.observation import FOV_MODES, NUM_FEATURES, WALL, encode_grid, observation_space_for
+from envs.spacefeatures import NUM_SPACE_FEATURES, batch_space_features
+from framebuffer import FrameRenderer
+
+# Per-orientation head deltas, indexed by Orientation.value (UP, RIGHT, DOWN, LEFT)
+DIRECTION_DX = np.array([0, 1, 0, -1], dtype=np.int64)
+DIRECTION_DY = np.array([-1, 0, 1, 0], dtype=np.int64)
+
+class VecSnakeEnv:
+    """
+    In-process vectorized Snake environment.
+
+    All games are held as struct-of-arrays state and stepped together with
+    NumPy array operations. Transitions, rewards and observations follow
+    SnakeEnv / TGame so the two can be swapped when training.
+    It follows the stable_baselines3 VecEnv API without importing stable_baselines3 (and torch), so that playing
+    exported policies does not load them; training uses envs.sb3_vec_env.SB3VecSnakeEnv, a VecEnv subclass.
+    Observations are built in the flat layout and encoded for compact obs_mode values.
+    Only the grid cells changed by a step are repainted, so stepping costs the same on large boards.
+    With render_mode="rgb_array", frames of every game are painted in one batch from the observation grids.
+
+    State arrays are sized for view_size (default: grid_num_squares) and each game plays on a board of its own size
+    within it, padded with 0 in observations. set_grid_num_squares resizes the boards of games as they reset.
+    Field-of-view modes keep a wall-padded copy of the grids and gather the window around each head from a strided view of it.
+
+    The infos of games ending an episode give its final score as info["episode_score"].
+    action_masks returns the legal actions of all games as an (N, 4) array, also given per game by info["action_mask"]:
+    reversals are masked, and with mask_collisions so are moves into a wall or the body.
+
+    space_features appends the reachable cells after each move and the path length to the apple to the features,
+    computed only for the games a step changed.
+    """
+
+    def __init__(self, num_envs: int, grid_num_squares: int, steps_max: int = 1000, seed: int = None, obs_mode: str = "flat", render_mode: str = None, cell_pixels: int = 8, view_size: int = None, fov_distance: int = 5, mask_collisions: bool = False, space_features: bool = False):
+        view_size = view_size or grid_num_squares
+        if grid_num_squares > view_size:
+            raise ValueError(f"Board of {grid_num_squares} squares does not fit the observed view of {view_size} squares.")
+
+        self.render_mode = render_mode
+        self.frame_renderer = FrameRenderer(view_size, cell_pixels) if render_mode == "rgb_array" else None
+
+        self.reward_move = -0.01
+        self.reward_collision = -10
+        self.reward_apple = 20
+        self.reward_timeout = -1
+        self.reward_surviving = 0
+
+        self.steps_max = steps_max
+        self.mask_collisions = mask_collisions
+        # Board size given to games on their next reset
+        self.grid_num_squares = grid_num_squares
+        self.view_size = view_size
+        self.initial_length = 3
+
+        n = num_envs
+        g = view_size
+
+        # Growing duplicates a part, so a cell holds at most two body parts
+        self.body_capacity = 2 * g * g
+
+        self.head_x = np.zeros(n, dtype=np.int64)
+        self.head_y = np.zeros(n, dtype=np.int64)
+        self.orientation = np.zeros(n, dtype=np.int64)
+        # The ring buffers are the largest arrays: their coordinates are stored as int16, widened for index arithmetic
+        self.body_x = np.zeros((n, self.body_capacity), dtype=np.int16)
+        self.body_y = np.zeros((n, self.body_capacity), dtype=np.int16)
+        self.body_start = np.zeros(n, dtype=np.int64)
+        self.body_len = np.zeros(n, dtype=np.int64)
+        # Number of body parts per cell; a grown snake may hold the same cell twice
+        self.occupancy = np.zeros((n, g, g), dtype=np.uint8)
+        self.apple_x = np.zeros(n, dtype=np.int64)
+        self.apple_y = np.zeros(n, dtype=np.int64)
+        self.score = np.zeros(n, dtype=np.int64)
+        self.steps_count = np.zeros(n, dtype=np.int64)
+        self.board_size = np.full(n, grid_num_squares, dtype=np.int64)
+
+        self.obs_mode = obs_mode
+        self.space_features = space_features
+        self.num_features = NUM_FEATURES + (NUM_SPACE_FEATURES if space_features else 0)
+        self.obs = np.zeros((n, g * g + self.num_features), dtype=np.float32)
+
+        self.fov_distance = fov_distance
+        self.fov_grid = None
+        if obs_mode in FOV_MODES:
+            self.fov_grid = np.full((n, g + 2 * fov_distance, g + 2 * fov_distance), WALL, dtype=np.uint8)
+        self.env_indices = np.arange(n)
+        self.actions = None
+        self.rng = np.random.default_rng(seed)
+
+        self.num_envs = n
+        self.observation_space = observation_space_for(view_size, obs_mode, fov_distance, space_features)
+        self.action_space = spaces.Discrete(4)
+        self.metadata = {"render_modes": ["rgb_array"] if render_mode == "rgb_array" else []}
+        # Infos of the last reset, and the seed and options of the next one, as kept by a VecEnv
+        self.reset_infos = [{} for _ in range(n)]
+        self._seeds = [None] * n
+        self._options = [{} for _ in range(n)]
+
+    def reset(self):
+        seed = self._seeds[0]
+        if seed is not None:
+            self.rng = np.random.default_rng(seed)
+        self._reset_seeds()
+        self._reset_options()
+
+        self._reset_envs(self.env_indices)
+        self._build_observations(self.env_indices)
+
+        masks = self.action_masks()
+        self.reset_infos = [{"score": 0, "steps": 0, "action_mask": masks[i]} for i in range(self.num_envs)]
+        return self._encode_observations(self.env_indices)
+
+    def step(self, actions: np.ndarray):
+        self.step_async(actions)
+        return self.step_wait()
+
+    def seed(self, seed: int = None) -> list:
+        """Seeds the games from the next reset on, as VecEnv.seed does"""
+        if seed is None:
+            seed = int(np.random.randint(0, np.iinfo(np.uint32).max, dtype=np.uint32))
+        self._seeds = [seed + i for i in range(self.num_envs)]
+        return self._seeds
+
+    def _reset_seeds(self):
+        self._seeds = [None] * self.num_envs
+
+    def _reset_options(self):
+        self._options = [{} for _ in range(self.num_envs)]
+
+    def step_async(self, actions: np.ndarray):
+        self.actions = np.asarray(actions, dtype=np.int64).reshape(self.num_envs)
+
+    def set_grid_num_squares(self, grid_num_squares: int):
+        """Resizes the board of every game from its next reset on, within the observed view"""
+        if grid_num_squares > self.view_size:
+            raise ValueError(f"Board of {grid_num_squares} squares does not fit the observed view of {self.view_size} squares.")
+        self.grid_num_squares = grid_num_squares
+
+    def step_wait(self):
+        actions = self.actions
+        idx = self.env_indices
+        g = self.board_size
+        last = self.view_size - 1
+
+        self.steps_count += 1
+
+        # Reversals are refused: the snake stays put and is penalized
+        reversed_ = actions == (self.orientation + 2) % 4
+        moving = ~reversed_
+
+        new_x = self.head_x + DIRECTION_DX[actions]
+        new_y = self.head_y + DIRECTION_DY[actions]
+        out_of_bound = (new_x < 0) | (new_x >= g) | (new_y < 0) | (new_y >= g)
+        hits_body = self.occupancy[idx, np.clip(new_y, 0, last), np.clip(new_x, 0, last)] > 0
+
+        dead = moving & (out_of_bound | hits_body)
+        moved = np.flatnonzero(moving & ~dead)
+
+        # Move: drop the tail, the old head becomes the newest body part
+        cap = self.body_capacity
+        tail = self.body_start[moved]
+        tail_x = self.body_x[moved, tail]
+        tail_y = self.body_y[moved, tail]
+        old_head_x = self.head_x[moved]
+        old_head_y = self.head_y[moved]
+        self.occupancy[moved, tail_y, tail_x] -= 1
+        self.body_start[moved] = (tail + 1) % cap
+        self.body_len[moved] -= 1
+        self._push_body_part(moved, old_head_x, old_head_y)
+
+        self.head_x[moved] = new_x[moved]
+        self.head_y[moved] = new_y[moved]
+        self.orientation[moved] = actions[moved]
+
+        ate = moved[(self.head_x[moved] == self.apple_x[moved]) & (self.head_y[moved] == self.apple_y[moved])]
+
+        # Grow by duplicating the newest body part, as TSnake.grow_snake does
+        neck = (self.body_start[ate] + self.body_len[ate] - 1) % cap
+        self._push_body_part(ate, self.body_x[ate, neck], self.body_y[ate, neck])
+        self.score[ate] += 1
+        won = self._place_apples(ate)
+
+        # Scores drop to 0 when a snake dies, the episode keeps the one before
+        episode_scores = self.score.copy()
+        self.score[dead] = 0
+
+        rewards = np.full(self.num_envs, self.reward_move + self.reward_surviving, dtype=np.float32)
+        rewards[reversed_] = self.reward_collision
+        rewards[ate] = self.reward_apple
+        rewards[dead] = self.reward_collision
+
+        terminated = dead.copy()
+        terminated[won] = True
+        truncated = self.steps_count >= self.steps_max
+        dones = terminated | truncated
+
+        # Only moved snakes changed: repaint their tail, previous head, head and new apple cells
+        placed = ate[self.apple_x[ate] >= 0]
+        self._patch_grids(np.concatenate([moved, moved, moved, placed]),
+                          np.concatenate([tail_x, old_head_x, self.head_x[moved], self.apple_x[placed]]),
+                          np.concatenate([tail_y, old_head_y, self.head_y[moved], self.apple_y[placed]]))
+        self._write_features(moved)
+
+        infos = [{"score": int(self.score[i]), "steps": int(self.steps_count[i])} for i in range(self.num_envs)]
+
+        done_indices = np.flatnonzero(dones)
+        if len(done_indices) > 0:
+            terminal_obs = self._encode_observations(done_indices)
+            for k, i in enumerate(done_indices):
+                if isinstance(terminal_obs, dict):
+                    infos[i]["terminal_observation"] = {key: value[k] for key, value in terminal_obs.items()}
+                else:
+                    infos[i]["terminal_observation"] = terminal_obs[k]
+                infos[i]["TimeLimit.truncated"] = bool(truncated[i] and not terminated[i])
+                infos[i]["episode_score"] = int(episode_scores[i])
+            self._reset_envs(done_indices)
+            self._build_observations(done_indices)
+
+        # Masks are those of the states the next actions are taken in, after the resets
+        masks = self.action_masks()
+        for i, info in enumerate(infos):
+            info["action_mask"] = masks[i]
+
+        return self._encode_observations(self.env_indices), rewards, dones, infos
+
+    def action_masks(self) -> np.ndarray:
+        """Returns the legal actions of every game as an (N, 4) boolean array indexed by action"""
+        masks = np.ones((self.num_envs, 4), dtype=bool)
+        masks[self.env_indices, (self.orientation + 2) % 4] = False
+        if not self.mask_collisions:
+            return masks
+
+        # The danger features already flag the deadly moves of every game
+        gg = self.view_size * self.view_size
+        safe = masks & (self.obs[:, gg + 10:gg + 14] == 0)
+        # A trapped snake still has to pick a move
+        return np.where(safe.any(axis=1)[:, None], safe, masks)
+
+    def _encode_observations(self, envs: np.ndarray):
+        """Returns a copy of the observations of the given envs in the env's observation mode"""
+        obs = self.obs[envs]
+        if self.obs_mode == "flat":
+            return obs
+
+        g = self.view_size
+        if self.fov_grid is not None:
+            return self._fov_observations(envs, obs[:, g * g:])
+
+        grid = obs[:, :g * g].reshape(len(obs), g, g).astype(np.uint8)
+        return {"grid": encode_grid(grid, self.obs_mode), "features": obs[:, g * g:].copy()}
+
+    def _fov_observations(self, envs: np.ndarray, features: np.ndarray) -> np.ndarray:
+        """Returns the windows of the padded grids centered on the heads of the given envs, followed by the features"""
+        fov_size = 2 * self.fov_distance + 1
+        n = len(envs)
+
+        # Window (y, x) of the padded grid is centered on board cell (x, y)
+        windows_view = np.lib.stride_tricks.sliding_window_view(self.fov_grid, (fov_size, fov_size), axis=(1, 2))
+        windows = windows_view[envs, self.head_y[envs], self.head_x[envs]]
+
+        if self.obs_mode == "fov_rotated":
+            # Turns each head's direction to the top row
+            orientation = self.orientation[envs]
+            for k in range(1, 4):
+                turned = orientation == k
+                windows[turned] = np.rot90(windows[turned], k, axes=(1, 2))
+
+        out = np.empty((n, fov_size * fov_size + self.num_features), dtype=np.float32)
+        out[:, :fov_size * fov_size] = windows.reshape(n, -1)
+        out[:, fov_size * fov_size:] = features
+        return out
+
+    def _push_body_part(self, envs: np.ndarray, xs: np.ndarray, ys: np.ndarray):
+        slot = (self.body_start[envs] + self.body_len[envs]) % self.body_capacity
+        self.body_x[envs, slot] = xs
+        self.body_y[envs, slot] = ys
+        self.body_len[envs] += 1
+        self.occupancy[envs, ys, xs] += 1
+
+    def _reset_envs(self, envs: np.ndarray):
+        body_len = self.initial_length - 1
+
+        self.board_size[envs] = self.grid_num_squares
+
+        self.occupancy[envs] = 0
+        self.body_start[envs] = 0
+        self.body_len[envs] = 0
+        for i in range(body_len):
+            self._push_body_part(envs, np.full(len(envs), i), np.zeros(len(envs), dtype=np.int64))
+
+        self.head_x[envs] = body_len
+        self.head_y[envs] = 0
+        self.orientation[envs] = 1  # Orientation.RIGHT
+        self.score[envs] = 0
+        self.steps_count[envs] = 0
+
+        self._place_apples(envs)
+
+    def _place_apples(self, envs: np.ndarray) -> np.ndarray:
+        """
+        Places a new apple on a uniformly drawn free cell for each of the given envs.
+        Returns the envs whose board is full, which count as won.
+        """
+        if len(envs) == 0:
+            return envs
+
+        g = self.view_size
+        free = self.occupancy[envs].reshape(len(envs), g * g) == 0
+        free[np.arange(len(envs)), self.head_y[envs] * g + self.head_x[envs]] = False
+
+        board_size = self.board_size[envs]
+        if np.any(board_size < g):
+            cells = np.arange(g * g)
+            free &= ((cells % g)[None, :] < board_size[:, None]) & ((cells // g)[None, :] < board_size[:, None])
+
+        free_counts = free.sum(axis=1)
+        picks = (self.rng.random(len(envs)) * free_counts).astype(np.int64)
+        cells = np.argmax(np.cumsum(free, axis=1) > picks[:, None], axis=1)
+
+        self.apple_x[envs] = cells % g
+        self.apple_y[envs] = cells // g
+
+        won = free_counts == 0
+        self.apple_x[envs[won]] = -1
+        self.apple_y[envs[won]] = -1
+
+        return envs[won]
+
+    def _build_observations(self, envs: np.ndarray):
+        g = self.view_size
+        gg = g * g
+        n = len(envs)
+        rows = np.arange(n)
+
+        head_x = self.head_x[envs]
+        head_y = self.head_y[envs]
+        apple_x = self.apple_x[envs]
+        apple_y = self.apple_y[envs]
+
+        # Grid: 0 = empty, 1 = snake part, 2 = snake head, 3 = apple
+        grid = self.obs[envs, :gg]
+        np.minimum(self.occupancy[envs].reshape(n, gg), 1, out=grid, casting="unsafe")
+        grid[rows, head_y * g + head_x] = 2
+        has_apple = apple_x >= 0
+        grid[rows[has_apple], (apple_y * g + apple_x)[has_apple]] = 3
+        self.obs[envs, :gg] = grid
+
+        if self.fov_grid is not None:
+            # Cells beyond each board are walls
+            f = self.fov_distance
+            cells = np.arange(g)
+            board_size = self.board_size[envs][:, None, None]
+            inside = (cells[None, :, None] < board_size) & (cells[None, None, :] < board_size)
+            self.fov_grid[envs, f:f + g, f:f + g] = np.where(inside, grid.reshape(n, g, g), WALL)
+
+        self._write_features(envs)
+
+    def _patch_grids(self, envs: np.ndarray, xs: np.ndarray, ys: np.ndarray):
+        """Repaints the observation grid cells (xs, ys) of the given envs, an env may be listed once per cell"""
+        values = np.minimum(self.occupancy[envs, ys, xs], 1)
+        values[(xs == self.head_x[envs]) & (ys == self.head_y[envs])] = 2
+        values[(xs == self.apple_x[envs]) & (ys == self.apple_y[envs])] = 3
+        self.obs[envs, ys * self.view_size + xs] = values
+        if self.fov_grid is not None:
+            self.fov_grid[envs, ys + self.fov_distance, xs + self.fov_distance] = values
+
+    def _write_features(self, envs: np.ndarray):
+        g = self.board_size[envs]
+        last = self.view_size - 1
+        gg = self.view_size * self.view_size
+        n = len(envs)
+        rows = np.arange(n)
+
+        features = np.zeros((n, NUM_FEATURES), dtype=np.float32)
+        head_x = self.head_x[envs]
+        head_y = self.head_y[envs]
+        apple_x = self.apple_x[envs]
+        apple_y = self.apple_y[envs]
+
+        has_apple = apple_x >= 0
+        features[:, 0] = np.where(has_apple, apple_x - head_x, 0)
+        features[:, 1] = np.where(has_apple, apple_y - head_y, 0)
+
+        features[:, 2] = head_y
+        features[:, 3] = g - head_x - 1
+        features[:, 4] = g - head_y - 1
+        features[:, 5] = head_x
+
+        features[rows, 6 + self.orientation[envs]] = 1
+
+        for direction in range(4):
+            next_x = head_x + DIRECTION_DX[direction]
+            next_y = head_y + DIRECTION_DY[direction]
+            out_of_bound = (next_x < 0) | (next_x >= g) | (next_y < 0) | (next_y >= g)
+            occupied = self.occupancy[envs, np.clip(next_y, 0, last), np.clip(next_x, 0, last)] > 0
+            features[:, 10 + direction] = out_of_bound | occupied
+
+        self.obs[envs, gg:gg + NUM_FEATURES] = features
+
+        if self.space_features:
+            tail = self.body_start[envs]
+            tail_x = self.body_x[envs, tail].astype(np.int64)
+            tail_y = self.body_y[envs, tail].astype(np.int64)
+            self.obs[envs, gg + NUM_FEATURES:] = batch_space_features(
+                self.occupancy[envs], g, head_x, head_y, tail_x, tail_y, apple_x, apple_y)
+
+    def render_frames(self) -> np.ndarray:
+        """Returns the current frames of all games as an (N, H, W, 3) uint8 array"""
+        g = self.view_size
+        grids = self.obs[:, :g * g].reshape(self.num_envs, g, g).astype(np.intp)
+        return self.frame_renderer.render_batch(grids)
+
+    def get_images(self):
+        return list(self.render_frames())
+
+    def close(self):
+        pass
+
+    def get_attr(self, attr_name: str, indices=None):
+        return [getattr(self, attr_name) for _ in self._get_indices(indices)]
+
+    def set_attr(self, attr_name: str, value, indices=None):
+        setattr(self, attr_name, value)
+
+    def env_method(self, method_name: str, *method_args, indices=None, **method_kwargs):
+        if method_name == "action_masks":
+            # One row per env, as a VecEnv of single envs returns them
+            return list(self.action_masks()[self._get_indices(indices)])
+        return [getattr(self, method_name)(*method_args, **method_kwargs) for _ in self._get_indices(indices)]
+
+    def env_is_wrapped(self, wrapper_class, indices=None):
+        return [False for _ in self._get_indices(indices)]
+
+    def _get_indices(self, indices):
+        if indices is None:
+            return range(self.num_envs)
+        if isinstance(indices, int):
+            return [indices]
+        return indices
@@ -0,0 +1,137 @@
+from concurrent.futures import ProcessPoolExecutor
+import json
+import multiprocessing as mp
+import os
+import re
+import time
+import zipfile
+
+import numpy as np
+
+def list_snapshots(run_path: str, model_prefix: str) -> list:
+    """Returns (name, path) of the periodic checkpoint snapshots saved in a training run directory, ordered by timesteps"""
+    snapshot_pattern = re.compile(rf"^{re.escape(model_prefix)}_(\d+)_steps\.zip$")
+
+    snapshots = []
+    for file_name in os.listdir(run_path):
+        match = snapshot_pattern.match(file_name)
+        if match:
+            snapshots.append((int(match.group(1)), file_name))
+    return [(file_name[:-len(".zip")], os.path.join(run_path, file_name)) for _, file_name in sorted(snapshots)]
+
+def list_checkpoints(run_path: str, model_prefix: str) -> list:
+    """
+    Returns (name, path) of every model saved in a training run directory: the periodic
+    CheckpointCallback snapshots ordered by timesteps, followed by the final model.
+    """
+    final = [(model_prefix, os.path.join(run_path, f"{model_prefix}.zip"))]
+    return list_snapshots(run_path, model_prefix) + [checkpoint for checkpoint in final if os.path.exists(checkpoint[1])]
+
+def checkpoint_timesteps(path: str) -> int:
+    """Returns the timesteps a stable_baselines3 checkpoint was trained for, read from its zip without loading the model"""
+    with zipfile.ZipFile(path) as archive:
+        return json.loads(archive.read("data"))["num_timesteps"]
+
+def _evaluate_chunk(checkpoint_path: str, grid_num_squares: int, view_size: int, obs_mode: str, num_episodes: int, num_envs: int, seed: int,
+                    space_features: bool = False) -> dict:
+    """
+    Plays num_episodes seeded episodes of one checkpoint on a VecSnakeEnv, predicting actions for all envs at once.
+    Each env plays a fixed share of the episodes, as stable_baselines3's evaluate_policy does: keeping the first
+    episodes to finish across envs would over-sample short episodes and bias the scores low.
+    MlpPolicy checkpoints are run by a NumpyPolicy, from their exported weights when up to date, which spares
+    loading torch and stable_baselines3. Other policies are run by stable_baselines3.
+    """
+    from envs.vec_snake_env import VecSnakeEnv
+    from numpypolicy import exported_or_checkpoint_path, load_policy
+
+    checkpoint_path = exported_or_checkpoint_path(checkpoint_path)
+    if not checkpoint_path.endswith(".npz"):
+        import torch
+
+        # Workers already run in parallel, extra torch threads only compete for cores
+        torch.set_num_threads(1)
+
+    model = load_policy(checkpoint_path)
+    env = VecSnakeEnv(num_envs=min(num_envs, num_episodes), grid_num_squares=grid_num_squares, seed=seed, obs_mode=obs_mode,
+                      view_size=view_size, space_features=space_features)
+    obs = env.reset()
+
+    episode_targets = [(num_episodes + i) // env.num_envs for i in range(env.num_envs)]
+    episode_counts = [0] * env.num_envs
+    scores = []
+    lengths = []
+    steps = 0
+
+    start = time.perf_counter()
+    while episode_counts != episode_targets:
+        actions, _ = model.predict(obs, deterministic=True)
+        obs, _, dones, infos = env.step(actions)
+        steps += env.num_envs
+
+        for i in np.flatnonzero(dones):
+            if episode_counts[i] < episode_targets[i]:
+                scores.append(infos[i]["episode_score"])
+                lengths.append(infos[i]["steps"])
+                episode_counts[i] += 1
+    elapsed = time.perf_counter() - start
+    env.close()
+
+    return {
+        "scores": scores,
+        "lengths": lengths,
+        "steps": steps,
+        "seconds": elapsed,
+    }
+
+def evaluate_checkpoints(checkpoints: list, grid_num_squares: int, obs_mode: str = "flat", episodes: int = 1000,
+                         workers: int = None, num_envs: int = 64, seed: int = 0, view_size: int = None,
+                         space_features: bool = False) -> list:
+    """
+    Evaluates every (name, path) checkpoint on the same seeded episodes, spread across a process pool.
+    Returns one result dict per checkpoint with score and episode length statistics and the env throughput.
+    """
+    num_workers = workers or os.cpu_count() or 1
+    chunk_episodes = [len(chunk) for chunk in np.array_split(np.arange(episodes), num_workers) if len(chunk) > 0]
+
+    context = mp.get_context("forkserver" if "forkserver" in mp.get_all_start_methods() else "spawn")
+    with ProcessPoolExecutor(max_workers=num_workers, mp_context=context) as executor:
+        futures = {
+            name: [executor.submit(_evaluate_chunk, path, grid_num_squares, view_size, obs_mode, episodes, num_envs, seed + chunk,
+                                   space_features)
+                   for chunk, episodes in enumerate(chunk_episodes)]
+            for name, path in checkpoints
+        }
+
+        results = []
+        for name, _ in checkpoints:
+            chunks = [future.result() for future in futures[name]]
+            scores = np.concatenate([chunk["scores"] for chunk in chunks])
+            lengths = np.concatenate([chunk["lengths"] for chunk in chunks])
+            steps = sum(chunk["steps"] for chunk in chunks)
+            # Chunks run in parallel, so throughput is summed over the per-chunk rates
+            steps_per_sec = sum(chunk["steps"] / chunk["seconds"] for chunk in chunks)
+
+            results.append({
+                "checkpoint": name,
+                "episodes": len(scores),
+                "mean_score": float(scores.mean()),
+                "p50_score": float(np.percentile(scores, 50)),
+                "p90_score": float(np.percentile(scores, 90)),
+                "p99_score": float(np.percentile(scores, 99)),
+                "max_score": int(scores.max()),
+                "mean_length": float(lengths.mean()),
+                "steps": steps,
+                "steps_per_sec": steps_per_sec,
+            })
+
+    return results
+
+def print_report(results: list):
+    best = max(results, key=lambda r: r["mean_score"])
+
+    print(f"{'checkpoint':<36} {'episodes':>8} {'mean':>8} {'p50':>6} {'p90':>6} {'p99':>6} {'max':>5} {'length':>8} {'steps/s':>10}")
+    for r in results:
+        marker = " *" if r is best else ""
+        print(f"{r['checkpoint']:<36} {r['episodes']:>8} {r['mean_score']:>8.2f} {r['p50_score']:>6.1f} {r['p90_score']:>6.1f} "
+              f"{r['p99_score']:>6.1f} {r['max_score']:>5} {r['mean_length']:>8.1f} {r['steps_per_sec']:>10.0f}{marker}")
+    print(f"Best checkpoint: {best['checkpoint']} (mean score {best['mean_score']:.2f})")
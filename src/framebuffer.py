@@ -0,0 +1,68 @@
+import math
+
+import numpy as np
+
+def tile_layout(num_frames: int) -> tuple:
+    """Returns the (rows, columns) of the most square grid holding num_frames tiles"""
+    num_cols = math.ceil(math.sqrt(num_frames))
+    return math.ceil(num_frames / num_cols), num_cols
+
+def tile_frames(frames: np.ndarray, out: np.ndarray = None, gap: int = 2) -> np.ndarray:
+    """
+    Tiles (N, H, W, 3) frames row by row into one image, separated by gap pixels.
+    The image is written into out when given, which must have the size returned for the same frames.
+    """
+    num_frames, height, width, _ = frames.shape
+    num_rows, num_cols = tile_layout(num_frames)
+
+    if out is None:
+        out = np.zeros((num_rows * (height + gap) - gap, num_cols * (width + gap) - gap, 3), dtype=np.uint8)
+
+    for i in range(num_frames):
+        top = (i // num_cols) * (height + gap)
+        left = (i % num_cols) * (width + gap)
+        out[top:top + height, left:left + width] = frames[i]
+    return out
+
+class FrameRenderer:
+    """
+    Paints RGB frames straight from grids of cell values (0 = empty, 1 = snake part, 2 = snake head, 3 = apple)
+    into preallocated (H, W, 3) uint8 NumPy buffers, one cell_pixels x cell_pixels block per cell.
+    Needs neither pygame nor a display, so it works on headless machines. The score text is not drawn.
+    """
+
+    # Same colors as Renderer, indexed by cell value
+    palette = np.array([
+        (0, 0, 0),      # empty
+        (0, 0, 100),    # snake part
+        (0, 0, 255),    # snake head
+        (255, 0, 0),    # apple
+    ], dtype=np.uint8)
+
+    def __init__(self, grid_num_squares: int, cell_pixels: int):
+        self.grid_num_squares = grid_num_squares
+        self.cell_pixels = cell_pixels
+        self.frame_size = grid_num_squares * cell_pixels
+        self.frame = np.zeros((self.frame_size, self.frame_size, 3), dtype=np.uint8)
+        self.frames = None
+
+    def render(self, grid: np.ndarray, copy: bool = True) -> np.ndarray:
+        """Paints one (n, n) grid; without copy the internal buffer is returned and overwritten by the next call"""
+        self._paint(grid[None], self.frame[None])
+        return self.frame.copy() if copy else self.frame
+
+    def render_batch(self, grids: np.ndarray, copy: bool = True) -> np.ndarray:
+        """Paints a batch of (N, n, n) grids into an (N, H, W, 3) buffer with a single fill"""
+        if self.frames is None or len(self.frames) != len(grids):
+            self.frames = np.zeros((len(grids), self.frame_size, self.frame_size, 3), dtype=np.uint8)
+
+        self._paint(grids, self.frames)
+        return self.frames.copy() if copy else self.frames
+
+    def _paint(self, grids: np.ndarray, frames: np.ndarray):
+        n = self.grid_num_squares
+        c = self.cell_pixels
+
+        # View each frame as (rows, row pixels, columns, column pixels, rgb) and broadcast the cell colors over the blocks
+        blocks = frames.reshape(len(frames), n, c, n, c, 3)
+        blocks[...] = self.palette[grids][:, :, None, :, None, :]
@@ -1,190 +1,132 @@
-from dataclasses import dataclass, field
-from typing import List
-import random
+import time
 
-import pygame
+import numpy as np
 
-from snake import TSnake, Orientation
-from renderer import Renderer
-from inputctrl import InputCtrl
+from snake import Orientation
+from gamecore import TGameCore
+from profiler import PhaseProfiler
 
-class TGame:
+class TGame(TGameCore):
+    """
+    TGameCore with optional pygame rendering and keyboard inputs.
+    pygame, the renderer and the input controller are only imported when enabled,
+    so headless games never load SDL.
+    """
 
-    @staticmethod
-    def initialize(game_name: str, grid_size_pixels: int, grid_num_squares: int, framerate: int, inputs_enabled: bool, rendering_enabled: bool, debug: bool):
+    # Ticks played at most per drawn frame when the loop falls behind
+    max_ticks_per_frame = 5
+
+    @classmethod
+    def initialize(cls, game_name: str, grid_size_pixels: int, grid_num_squares: int, framerate: int, inputs_enabled: bool, rendering_enabled: bool, debug: bool, rng: np.random.Generator = None):
 
         # initialize game
-        tgame = TGame()
-        tgame.debug = debug
-        tgame.set_score(0)
-        tgame.set_terminated(False)
-        tgame.game_name = game_name
-        tgame.tsnake = None
-        tgame.apple_coords = None
-        tgame.fov_distance = 5
+        tgame = super().initialize(game_name, grid_num_squares, debug, rng)
         tgame.framerate = framerate
+        tgame.inputctrl = None
+        tgame.renderer = None
 
-        tgame.inputctrl = InputCtrl(tgame)
+        # Pixels only matter when drawing the board, headless games accept any size
+        if rendering_enabled:
+            bvalid = tgame.__validate_size_square_fits(grid_size_pixels, grid_num_squares)
+            if not bvalid:
+                raise ValueError("grid_size_pixels modulo grid_num_squares doesn't equate zero.  Fatal error.")
 
-        # Disable reacting to keyboard keydown events
-        if not inputs_enabled:
-            tgame.inputctrl.set_controls_enabled(False)
+        tgame.grid_size_pixels = grid_size_pixels
 
-        bvalid = tgame.__validate_size_square_fits(grid_size_pixels, grid_num_squares)
-        if not bvalid:
-            raise ValueError("grid_size_pixels modulo grid_num_squares doesn't equate zero.  Fatal error.")
+        if inputs_enabled or rendering_enabled:
+            import pygame
+            from inputctrl import InputCtrl
 
-        tgame.grid_size_pixels = grid_size_pixels
-        tgame.grid_num_squares = grid_num_squares
+            pygame.init()
 
-        pygame.init()
+            tgame.inputctrl = InputCtrl(tgame)
+
+            # Disable reacting to keyboard keydown events
+            if not inputs_enabled:
+                tgame.inputctrl.set_controls_enabled(False)
 
         if rendering_enabled:
+            from renderer import Renderer
             tgame.renderer = Renderer(tgame)
 
         return tgame
 
-    def create_snake(self):
-        default_orientation = Orientation.RIGHT
-        self.tsnake = TSnake(default_orientation)
-    
-    def create_apple(self):
-        """
-        Generates the coordinates for a new apple in the Snake game.
-
-        The function randomly generates a pair of coordinates within the grid's bounds 
-        and ensures that the apple does not overlap with the snake's head or body. 
-        If a collision is detected, the process is repeated until a valid position is found.
-        """
-        while True:
-            random_x = random.randrange(0, self.grid_num_squares)
-            random_y = random.randrange(0, self.grid_num_squares)
-            apple_coords = (random_x, random_y)
-
-            if (apple_coords != (self.tsnake.head_x, self.tsnake.head_y)
-                and apple_coords not in self.tsnake.snake_parts):
-                break
-
-        self.apple_coords = (random_x, random_y)
-
     def __validate_size_square_fits(self, grid_size_pixels: int, grid_num_squares: int):
         if grid_size_pixels % grid_num_squares > 0:
             return False
-        
-        return True
-    
-    def coord_is_out_of_bound(self, coords: tuple):
-        if  (coords[0] >= self.grid_num_squares or
-            coords[0] < 0 or
-            coords[1] >= self.grid_num_squares or
-            coords[1] < 0):
-            return True
-        return False
-    
-    def set_score(self, score: int):
-        self.score = score
-    
-    def is_snake_colliding_with_apple(self):
-        if self.tsnake.head_x == self.apple_coords[0] and self.tsnake.head_y == self.apple_coords[1]:
-            return True
-        return False
-
-    def is_snake_colliding_with_itself(self):
-        for part in self.tsnake.snake_parts:
-            if part[0] == self.tsnake.head_x and part[1] == self.tsnake.head_y:
-                return True
-        return False
-
-    def reset(self):
-        self.create_snake()
-        self.create_apple()
-        self.set_score(0)
-        self.set_terminated(False)
-    
-    def set_terminated(self, is_terminated: bool):
-        self.is_terminated = is_terminated
-    
-    def close(self):
-        pygame.quit()
-    
-    def perform_action(self, orientation: Orientation):
-        # Prevent the snake from reversing directly onto itself
-        if  (orientation == Orientation.UP and self.tsnake.head_orientation == Orientation.DOWN) or \
-            (orientation == Orientation.DOWN and self.tsnake.head_orientation == Orientation.UP) or \
-            (orientation == Orientation.LEFT and self.tsnake.head_orientation == Orientation.RIGHT) or \
-            (orientation == Orientation.RIGHT and self.tsnake.head_orientation == Orientation.LEFT):
-                orientation = self.tsnake.head_orientation  # Maintain current direction
-                return False
-
-        # Calculate where the head will be after moving
-        new_head_x = self.tsnake.head_x
-        new_head_y = self.tsnake.head_y
-    
-        if orientation == Orientation.UP:
-            new_head_y -= 1
-        elif orientation == Orientation.RIGHT:
-            new_head_x += 1
-        elif orientation == Orientation.DOWN:
-            new_head_y += 1
-        elif orientation == Orientation.LEFT:
-            new_head_x -= 1
-        
-        # Check if the next move would be out of bounds
-        if self.coord_is_out_of_bound((new_head_x, new_head_y)):
-            if self.debug:
-                print("Snake out of bound")
-
-            self.tsnake.set_alive(False)
-            self.set_score(0)
-            return False
 
-        # Check if the next move would collide with snake body
-        if (new_head_x, new_head_y) in self.tsnake.snake_parts:
-            if self.debug:
-                print("Snake collided with itself")
+        return True
 
-            self.tsnake.set_alive(False)
-            self.set_score(0)
-            return False
-        
-        # If we get here, the move is safe, so execute it
-        self.tsnake.move_snake(orientation)
+    def enable_profiling(self, profiler: PhaseProfiler):
+        """Times the game phases and, when rendering is enabled, the render phase with profiler"""
+        super().enable_profiling(profiler)
+        if self.renderer is not None:
+            profiler.instrument(self.renderer, "render_all", "render")
 
-        if(self.is_snake_colliding_with_apple()):
-            if self.debug:
-                print("Snake eats an apple")
+    def close(self):
+        if self.inputctrl is not None:
+            import pygame
+            pygame.quit()
+
+    def tick(self) -> bool:
+        """Plays one game tick with the next queued turn. Returns True if the snake moved."""
+        future_orientation = self.inputctrl.next_orientation()
+        if future_orientation == Orientation.NONE:
+            future_orientation = self.tsnake.head_orientation
 
-            self.tsnake.grow_snake()
-            self.create_apple()
-            self.set_score(self.score + 1)
+        return self.perform_action(future_orientation)
 
-        return True
+    def start_game_loop(self, render_framerate: int = 60):
+        """
+        Runs the game at framerate ticks per second, decoupled from drawing: events are read and frames drawn
+        render_framerate times per second, key presses being queued for the coming ticks, and frames between ticks
+        show the snake part-way through its last move.
+        """
+        import pygame
 
-    def start_game_loop(self):
         renderer = self.renderer
         inputctrl = self.inputctrl
+        tick_seconds = 1 / self.framerate
 
-        # Start clock, used for game loop
+        # Start clock, used to pace frames
         clock = pygame.time.Clock()
+        previous_time = time.perf_counter()
+        accumulated = 0.0
+        moved = False
+        previous_head = previous_tail = None
 
         # main loop
         while not self.is_terminated:
 
-            if self.tsnake.is_alive == False:
-                self.reset()
-
-            future_orientation = self.tsnake.head_orientation
-
-            # Change game state base on events event
-            input_orientation = inputctrl.change_gamestate_input_events()
-            if inputctrl.controls_enabled:
-                if input_orientation != Orientation.NONE:
-                    future_orientation = input_orientation
-            
-            action_possible = self.perform_action(future_orientation)
-
-            renderer.render_all()
-
-            clock.tick(self.framerate)
-        
-        self.close()
\ No newline at end of file
+            inputctrl.poll_events()
+
+            now = time.perf_counter()
+            accumulated += now - previous_time
+            previous_time = now
+
+            # Catch up on the ticks due, dropping the backlog of a stall rather than fast-forwarding through it
+            ticks = 0
+            while accumulated >= tick_seconds and ticks < self.max_ticks_per_frame:
+                if self.tsnake.is_alive == False or self.is_won:
+                    self.reset()
+                    inputctrl.clear()
+
+                previous_head = (self.tsnake.head_x, self.tsnake.head_y)
+                previous_tail = self.tsnake.snake_parts[0]
+                moved = self.tick()
+                accumulated -= tick_seconds
+                ticks += 1
+            if ticks == self.max_ticks_per_frame:
+                accumulated = min(accumulated, tick_seconds)
+
+            # Only the last move of a frame is tracked, so the cells left behind by the moves before it need a full redraw
+            if ticks > 1:
+                renderer.render_all(full=True)
+            elif moved:
+                renderer.render_interpolated(previous_head, previous_tail, min(accumulated / tick_seconds, 1.0))
+            else:
+                renderer.render_all()
+
+            clock.tick(render_framerate)
+
+        self.close()
@@ -0,0 +1,203 @@
+import numpy as np
+
+from profiler import PhaseProfiler
+from snake import TSnake, Orientation
+
+# Head deltas (dx, dy) indexed by Orientation.value (UP, RIGHT, DOWN, LEFT)
+DIRECTION_DELTAS = ((0, -1), (1, 0), (0, 1), (-1, 0))
+
+class TGameCore:
+    """
+    Game rules of Snake: moving, collisions, apples and scoring.
+    Has no pygame dependency so it can run headless; rendering and inputs are added by TGame.
+    """
+
+    # Number of uniform draws fetched from the random generator at once
+    rng_batch_size = 256
+
+    @classmethod
+    def initialize(cls, game_name: str, grid_num_squares: int, debug: bool, rng: np.random.Generator = None):
+
+        # initialize game
+        tgame = cls()
+        tgame.debug = debug
+        tgame.set_score(0)
+        tgame.set_terminated(False)
+        tgame.set_won(False)
+        tgame.game_name = game_name
+        tgame.tsnake = None
+        tgame.apple_coords = None
+        tgame.fov_distance = 5
+        tgame.grid_num_squares = grid_num_squares
+        tgame.rng = None
+        tgame.set_rng(rng if rng is not None else np.random.default_rng())
+
+        return tgame
+
+    def set_rng(self, rng: np.random.Generator):
+        """Sets the random generator driving apple placement. Draws already fetched from a previous generator are dropped."""
+        if rng is self.rng:
+            return
+
+        self.rng = rng
+        self.random_batch = None
+        self.random_batch_index = self.rng_batch_size
+
+    def peek_random(self) -> float:
+        """Returns the next uniform draw in [0, 1) without consuming it, refilling the pre-drawn batch when exhausted"""
+        if self.random_batch_index >= self.rng_batch_size:
+            self.random_batch = self.rng.random(self.rng_batch_size).tolist()
+            self.random_batch_index = 0
+
+        return self.random_batch[self.random_batch_index]
+
+    def next_random(self) -> float:
+        """Returns the next uniform draw in [0, 1)"""
+        value = self.peek_random()
+        self.random_batch_index += 1
+        return value
+
+    def create_snake(self):
+        default_orientation = Orientation.RIGHT
+        self.tsnake = TSnake(default_orientation, self.grid_num_squares)
+
+    def create_apple(self):
+        """
+        Generates the coordinates for a new apple in the Snake game.
+
+        The apple is drawn uniformly from the snake's free-cell index, so it never
+        overlaps the snake's head or body. When no cell is left the board is full:
+        the game is won and apple_coords is set to None.
+        """
+        num_free_cells = self.tsnake.num_free_cells()
+        if num_free_cells == 0:
+            self.apple_coords = None
+            self.set_won(True)
+            return
+
+        index = min(int(self.next_random() * num_free_cells), num_free_cells - 1)
+        self.apple_coords = self.tsnake.get_free_cell(index)
+
+    def coord_is_out_of_bound(self, coords: tuple):
+        if  (coords[0] >= self.grid_num_squares or
+            coords[0] < 0 or
+            coords[1] >= self.grid_num_squares or
+            coords[1] < 0):
+            return True
+        return False
+
+    def set_score(self, score: int):
+        self.score = score
+
+    def set_won(self, is_won: bool):
+        self.is_won = is_won
+
+    def is_snake_colliding_with_apple(self):
+        if self.apple_coords is None:
+            return False
+        if self.tsnake.head_x == self.apple_coords[0] and self.tsnake.head_y == self.apple_coords[1]:
+            return True
+        return False
+
+    def is_snake_colliding_with_itself(self):
+        return self.tsnake.is_part_at(self.tsnake.head_x, self.tsnake.head_y)
+
+    def is_move_colliding(self, new_head_x: int, new_head_y: int) -> bool:
+        """Returns True if moving the head to (new_head_x, new_head_y) leaves the board or hits the body"""
+        # Check if the next move would be out of bounds
+        if self.coord_is_out_of_bound((new_head_x, new_head_y)):
+            if self.debug:
+                print("Snake out of bound")
+            return True
+
+        # Check if the next move would collide with snake body
+        if self.tsnake.is_part_at(new_head_x, new_head_y):
+            if self.debug:
+                print("Snake collided with itself")
+            return True
+
+        return False
+
+    def action_mask(self, avoid_collisions: bool = False) -> np.ndarray:
+        """
+        Returns the legal actions as 4 booleans indexed by Orientation value: every direction but the reversal of the head,
+        which perform_action refuses. avoid_collisions also masks the moves into a wall or the body, unless all are deadly.
+        """
+        tsnake = self.tsnake
+        mask = [True] * 4
+        mask[(tsnake.head_orientation.value + 2) % 4] = False
+        if not avoid_collisions:
+            return np.array(mask)
+
+        safe = list(mask)
+        for value, (dx, dy) in enumerate(DIRECTION_DELTAS):
+            x = tsnake.head_x + dx
+            y = tsnake.head_y + dy
+            if safe[value] and (self.coord_is_out_of_bound((x, y)) or tsnake.is_part_at(x, y)):
+                safe[value] = False
+
+        # A trapped snake still has to pick a move
+        return np.array(safe if any(safe) else mask)
+
+    def enable_profiling(self, profiler: PhaseProfiler):
+        """Times the action, collision and apple spawn phases of every step with profiler"""
+        profiler.instrument(self, "perform_action", "action")
+        profiler.instrument(self, "is_move_colliding", "collision")
+        profiler.instrument(self, "create_apple", "apple_spawn")
+
+    def enable_recording(self, recorder):
+        """Records the episodes played from now on with a replay.EpisodeRecorder, written when the game resets or closes"""
+        recorder.attach(self)
+
+    def reset(self):
+        self.create_snake()
+        self.set_won(False)
+        self.create_apple()
+        self.set_score(0)
+        self.set_terminated(False)
+
+    def set_terminated(self, is_terminated: bool):
+        self.is_terminated = is_terminated
+
+    def close(self):
+        pass
+
+    def perform_action(self, orientation: Orientation):
+        # Prevent the snake from reversing directly onto itself
+        if  (orientation == Orientation.UP and self.tsnake.head_orientation == Orientation.DOWN) or \
+            (orientation == Orientation.DOWN and self.tsnake.head_orientation == Orientation.UP) or \
+            (orientation == Orientation.LEFT and self.tsnake.head_orientation == Orientation.RIGHT) or \
+            (orientation == Orientation.RIGHT and self.tsnake.head_orientation == Orientation.LEFT):
+                orientation = self.tsnake.head_orientation  # Maintain current direction
+                return False
+
+        # Calculate where the head will be after moving
+        new_head_x = self.tsnake.head_x
+        new_head_y = self.tsnake.head_y
+
+        if orientation == Orientation.UP:
+            new_head_y -= 1
+        elif orientation == Orientation.RIGHT:
+            new_head_x += 1
+        elif orientation == Orientation.DOWN:
+            new_head_y += 1
+        elif orientation == Orientation.LEFT:
+            new_head_x -= 1
+
+        if self.is_move_colliding(new_head_x, new_head_y):
+            self.tsnake.set_alive(False)
+            self.set_score(0)
+            return False
+
+        # If we get here, the move is safe, so execute it
+        self.tsnake.move_snake(orientation)
+
+        if(self.is_snake_colliding_with_apple()):
+            if self.debug:
+                print("Snake eats an apple")
+
+            self.tsnake.grow_snake()
+            self.create_apple()
+            self.set_score(self.score + 1)
+
+        return True
@@ -0,0 +1,95 @@
+import argparse
+from collections import defaultdict
+import os
+import subprocess
+import sys
+
+# Imports each command line mode performs before it starts, the time they may take and the packages they must not load
+MODES = {
+    "help": ("import main", 100, ("numpy", "pygame", "gymnasium", "torch", "stable_baselines3")),
+    "int": ("import main, game, renderer, inputctrl", 600, ("gymnasium", "torch", "stable_baselines3")),
+    "replay": ("import main, replay, game, renderer, inputctrl", 600, ("gymnasium", "torch", "stable_baselines3")),
+    "ai": ("import main, ai_controller, numpypolicy, renderer, inputctrl", 1200, ("torch", "stable_baselines3")),
+    # ai --games steps the tiled games with a VecSnakeEnv
+    "ai_games": ("import main, ai_controller, numpypolicy, envs.vec_snake_env", 1200, ("torch", "stable_baselines3")),
+    "eval": ("import main, evaluation", 400, ("gymnasium", "torch", "stable_baselines3")),
+    # Evaluation workers playing exported weights, checkpoints without them load stable_baselines3
+    "eval_worker": ("import main, evaluation, envs.vec_snake_env, numpypolicy", 1200, ("torch", "stable_baselines3")),
+    # Subprocess envs load main, the worker loop and the env constructor pickled by AIController
+    "train_worker": ("import main, envs.shm_worker, ai_controller", 1200, ("torch", "stable_baselines3")),
+    "train": ("import main, ai_controller, callbacks, envs.shm_vec_env, envs.sb3_vec_env", 8000, ()),
+}
+
+def measure_imports(statement: str) -> list:
+    """
+    Runs statement in a fresh interpreter with -X importtime from the source directory.
+    Returns (module, self_us, cumulative_us, depth) for every module imported, interpreter startup included.
+    """
+    src_dir = os.path.dirname(os.path.abspath(__file__))
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", statement], cwd=src_dir,
+                            capture_output=True, text=True, env=dict(os.environ, SDL_VIDEODRIVER="dummy"))
+    if result.returncode != 0:
+        raise RuntimeError(f"'{statement}' failed:\n{result.stderr}")
+
+    # Lines read "import time: <self us> | <cumulative us> | <indented module name>", two spaces per nesting level
+    imports = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        depth = (len(name) - len(name.lstrip())) // 2 - 1
+        imports.append((name.strip(), int(self_us), int(cumulative_us), depth))
+    return imports
+
+def package_costs(imports: list) -> dict:
+    """Sums the self import time of the modules of each top-level package, in microseconds"""
+    costs = defaultdict(int)
+    for name, self_us, _, _ in imports:
+        costs[name.split(".")[0]] += self_us
+    return dict(costs)
+
+def check_mode(mode: str, repeat: int, budget_scale: float, top: int) -> list:
+    """Prints the import cost of mode and returns the description of every budget it breaks"""
+    statement, budget_ms, forbidden = MODES[mode]
+
+    # The fastest run leaves out cold caches and compiling
+    imports = min((measure_imports(statement) for _ in range(repeat)), key=lambda i: sum(entry[1] for entry in i))
+    total_ms = sum(entry[1] for entry in imports) / 1000
+    costs = package_costs(imports)
+
+    print(f"{mode:<14} {total_ms:>8.1f} ms  budget {budget_ms * budget_scale:>7.0f} ms  ({statement})")
+    for package, cost_us in sorted(costs.items(), key=lambda item: -item[1])[:top]:
+        print(f"    {package:<28} {cost_us / 1000:>8.1f} ms")
+
+    failures = []
+    loaded = sorted(set(costs) & set(forbidden))
+    if loaded:
+        failures.append(f"{mode}: loads {', '.join(loaded)}")
+    if total_ms > budget_ms * budget_scale:
+        failures.append(f"{mode}: {total_ms:.1f} ms of imports over the budget of {budget_ms * budget_scale:.0f} ms")
+    return failures
+
+def parse_commandline_args():
+    parser = argparse.ArgumentParser(description="Import-time budget check of the command line modes", add_help=True)
+    parser.add_argument('--modes', type=str, nargs='+', default=list(MODES), choices=list(MODES), help='Modes to check')
+    parser.add_argument('--repeat', type=int, default=3, help='Runs per mode, the fastest one is reported')
+    parser.add_argument('--budget-scale', type=float, default=1.0, dest="budget_scale",
+                        help='Multiplier of the time budgets, for slower machines')
+    parser.add_argument('--top', type=int, default=8, help='Number of the most expensive packages listed per mode')
+    return parser.parse_args()
+
+def main():
+    args = parse_commandline_args()
+
+    failures = []
+    for mode in args.modes:
+        failures += check_mode(mode, args.repeat, args.budget_scale, args.top)
+
+    if failures:
+        print("Import budget exceeded:")
+        for line in failures:
+            print(f"  {line}")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
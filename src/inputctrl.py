@@ -1,31 +1,64 @@
 from __future__ import annotations
 
+from collections import deque
+
 import pygame
 
 from snake import TSnake, Orientation
 
+# Arrow keys and the orientation they turn the snake to
+KEY_ORIENTATIONS = {
+    pygame.K_LEFT: Orientation.LEFT,
+    pygame.K_RIGHT: Orientation.RIGHT,
+    pygame.K_UP: Orientation.UP,
+    pygame.K_DOWN: Orientation.DOWN,
+}
+
 class InputCtrl():
+    """
+    Reads the pygame event queue and buffers the turns pressed between game ticks, one turn being played per tick.
+    A turn repeating or reversing the one before it would not change the snake's course, so it is not queued.
+    """
+
+    # Turns kept ahead of the game, further presses are dropped until a tick plays one
+    queue_size = 3
 
     def __init__(self, tgame: TGame):
         self.tgame = tgame
         self.controls_enabled = True
+        self.queued_orientations = deque()
 
     def set_controls_enabled(self, val: bool):
         self.controls_enabled = val
 
-    def change_gamestate_input_events(self):
-        # event handling, gets all event from the event queue
+    def clear(self):
+        self.queued_orientations.clear()
+
+    def queue_orientation(self, orientation: Orientation):
+        if len(self.queued_orientations) >= self.queue_size:
+            return
+
+        last = self.queued_orientations[-1] if self.queued_orientations else self.tgame.tsnake.head_orientation
+        if orientation == last or orientation.value == (last.value + 2) % 4:
+            return
+        self.queued_orientations.append(orientation)
+
+    def poll_events(self):
+        """Handles every pending event: quitting terminates the game and arrow keys queue turns"""
         for event in pygame.event.get():
             if event.type == pygame.QUIT:
                 self.tgame.set_terminated(True)
-            if event.type == pygame.KEYDOWN:
-                if event.key == pygame.K_LEFT:
-                    return Orientation.LEFT
-                elif event.key == pygame.K_RIGHT:
-                    return Orientation.RIGHT
-                elif event.key == pygame.K_UP:
-                    return Orientation.UP
-                elif event.key == pygame.K_DOWN:
-                    return Orientation.DOWN
-        
-        return Orientation.NONE
\ No newline at end of file
+            elif event.type == pygame.KEYDOWN and self.controls_enabled:
+                orientation = KEY_ORIENTATIONS.get(event.key)
+                if orientation is not None:
+                    self.queue_orientation(orientation)
+
+    def next_orientation(self) -> Orientation:
+        """Returns the next queued turn, Orientation.NONE when there is none"""
+        if self.queued_orientations:
+            return self.queued_orientations.popleft()
+        return Orientation.NONE
+
+    def change_gamestate_input_events(self):
+        self.poll_events()
+        return self.next_orientation()
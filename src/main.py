@@ -3,36 +3,119 @@ from datetime import datetime
 from enum import Enum
 import os
 
-import pygame
-
-from game import TGame
-from inputctrl import InputCtrl
-from renderer import Renderer
-from snake import TSnake, Orientation
-from envs.snake_env import SnakeEnv
+# Each mode imports what it needs when it runs, so that --help and short-lived modes start fast
+# and the subprocess envs started from this module do not load torch
+from envs.obsmodes import OBS_MODES
 
 class Gamemode(Enum):
     INTERACTIVE = 1
     TRAIN = 2
     AI = 3
+    EVAL = 4
+    REPLAY = 5
+    EXPORT = 6
 
-def parse_commandline_args() -> tuple:
-    opts = None
+def parse_commandline_args() -> argparse.Namespace:
+    def board_parser(grid_size_default: int | None, grid_size_help: str) -> argparse.ArgumentParser:
+        """Returns the parent parser of the board options, one per mode as parents share their actions and defaults"""
+        parser = argparse.ArgumentParser(add_help=False)
+        parser.add_argument('--grid-size', type=int, default=grid_size_default, required=False, dest="grid_size",
+                            help=f'Number of squares on each side of the board (default: {grid_size_help})')
+        parser.add_argument('--view-size', type=int, default=None, required=False, dest="view_size",
+                            help='Observed grid size of the model, boards smaller than it are padded (default: largest board)')
+        return parser
 
     main_parser = argparse.ArgumentParser(add_help=True)
     main_parser.add_argument('--debug', default=False, required=False, action='store_true', dest="debug", help='Set debug flag')
     subparsers = main_parser.add_subparsers(title="service", dest="service_commands")
 
-    interactive_parser = subparsers.add_parser("int", help="Runs snake in interactive mode", add_help=True)
+    interactive_parser = subparsers.add_parser("int", help="Runs snake in interactive mode", add_help=True,
+                                               parents=[board_parser(20, "20")])
     interactive_parser.set_defaults(mode=Gamemode.INTERACTIVE)
+    interactive_parser.add_argument('--record', type=str, default=None, required=False, dest="record",
+                          help='Replay file the played episodes are appended to')
 
-    train_parser = subparsers.add_parser("train", help="Runs snake in auto-training mode", add_help=True)
+    train_parser = subparsers.add_parser("train", help="Runs snake in auto-training mode", add_help=True,
+                                         parents=[board_parser(None, "20, or the resumed run's")])
+    # Unset board and observation options keep the settings of the config file or resumed run
     train_parser.set_defaults(mode=Gamemode.TRAIN)
+    train_parser.add_argument('--config', type=str, default=None, required=False, dest="config",
+                          help='JSON file of training settings (see trainconfig.TrainConfig), overridden by the options below')
+    train_parser.add_argument('--resume', type=str, default=None, required=False, dest="resume",
+                          help='Training run directory name to continue from its newest checkpoint, with its saved settings')
+    train_parser.add_argument('--envs', type=int, default=None, required=False, dest="num_envs",
+                          help='Number of subprocess envs (default: one per core)')
+    train_parser.add_argument('--vec-envs', type=int, default=None, required=False, dest="vec_envs",
+                          help='Number of games stepped in-process by the vectorized env instead of subprocess envs')
+    train_parser.add_argument('--timesteps', type=int, default=None, required=False, dest="total_timesteps",
+                          help='Total timesteps of the run (default: 2M)')
+    train_parser.add_argument('--n-steps', type=int, default=None, required=False, dest="n_steps",
+                          help='Steps per env between two policy updates')
+    train_parser.add_argument('--batch-size', type=int, default=None, required=False, dest="batch_size",
+                          help='Minibatch size of the policy updates')
+    train_parser.add_argument('--learning-rate', type=float, default=None, required=False, dest="learning_rate",
+                          help='Learning rate of the policy updates')
+    train_parser.add_argument('--torch-threads', type=int, default=None, required=False, dest="torch_threads",
+                          help='Number of threads torch uses for the policy updates')
+    train_parser.add_argument('--obs-mode', type=str, default=None, choices=OBS_MODES, dest="obs_mode",
+                          help='Observation encoding: flat float32 vector, uint8 grid, one-hot planes or bit-packed planes (default: flat)')
+    train_parser.add_argument('--space-features', default=None, required=False, action='store_true', dest="space_features",
+                          help='Append reachable cells per move and the path length to the apple to the observed features')
+    train_parser.add_argument('--profile', default=False, required=False, action='store_true', dest="profile",
+                          help='Log per-phase step timings of the subprocess envs to TensorBoard')
+    train_parser.add_argument('--record-episodes', default=None, required=False, action='store_true', dest="record_episodes",
+                          help='Append the episodes of every subprocess env to replay files in the run directory')
+    train_parser.add_argument('--step-kernel', default=None, required=False, action='store_true', dest="step_kernel",
+                          help='Step the subprocess envs with the step kernel (compiled with Numba when installed)')
+    train_parser.add_argument('--curriculum', type=int, nargs='+', default=None, required=False, dest="curriculum",
+                          help='Board sizes trained in turn, each for an equal share of the run (e.g. 10 20 40)')
 
-    ai_parser = subparsers.add_parser("ai", help="Runs snake in AI mode", add_help=True)
+    ai_parser = subparsers.add_parser("ai", help="Runs snake in AI mode", add_help=True,
+                                      parents=[board_parser(None, "the run's saved settings")])
     ai_parser.set_defaults(mode=Gamemode.AI)
     ai_parser.add_argument('--checkpoint', type=str, required=False,
                           help='Path to model checkpoint file')
+    ai_parser.add_argument('--obs-mode', type=str, default=None, choices=OBS_MODES, dest="obs_mode",
+                          help='Observation encoding the model was trained with (default: the run\'s saved settings)')
+    ai_parser.add_argument('--space-features', default=None, required=False, action='store_true', dest="space_features",
+                          help='Observe the reachable space features, as the model was trained with (default: the run\'s saved settings)')
+    ai_parser.add_argument('--games', type=int, default=1, required=False, dest="games",
+                          help='Number of games played at once and shown as tiles of one window')
+    ai_parser.add_argument('--record', type=str, default=None, required=False, dest="record",
+                          help='Replay file the played episodes are appended to (single game only)')
+
+    eval_parser = subparsers.add_parser("eval", help="Evaluates every checkpoint of a training run headlessly", add_help=True,
+                                        parents=[board_parser(None, "the run's saved settings")])
+    eval_parser.set_defaults(mode=Gamemode.EVAL)
+    eval_parser.add_argument('--checkpoint', type=str, required=False,
+                          help='Training run directory name (default: latest run)')
+    eval_parser.add_argument('--obs-mode', type=str, default=None, choices=OBS_MODES, dest="obs_mode",
+                          help='Observation encoding the model was trained with (default: the run\'s saved settings)')
+    eval_parser.add_argument('--space-features', default=None, required=False, action='store_true', dest="space_features",
+                          help='Observe the reachable space features, as the model was trained with (default: the run\'s saved settings)')
+    eval_parser.add_argument('--episodes', type=int, default=2000, required=False, dest="episodes",
+                          help='Number of seeded episodes played per checkpoint')
+    eval_parser.add_argument('--workers', type=int, default=None, required=False, dest="workers",
+                          help='Number of evaluation processes (default: number of cores)')
+    eval_parser.add_argument('--vec-envs', type=int, default=64, required=False, dest="vec_envs",
+                          help='Number of games stepped together by each process')
+    eval_parser.add_argument('--seed', type=int, default=0, required=False, dest="seed",
+                          help='Base seed of the evaluation episodes')
+
+    export_parser = subparsers.add_parser("export", help="Exports the final model of a training run to NumPy weights", add_help=True)
+    export_parser.set_defaults(mode=Gamemode.EXPORT)
+    export_parser.add_argument('--checkpoint', type=str, required=False,
+                          help='Training run directory name (default: latest run)')
+
+    replay_parser = subparsers.add_parser("replay", help="Plays back the episodes of a replay file", add_help=True)
+    replay_parser.set_defaults(mode=Gamemode.REPLAY)
+    replay_parser.add_argument('file', type=str, help='Replay file recorded with --record or --record-episodes')
+    replay_parser.add_argument('--episode', type=int, default=0, required=False, dest="episode",
+                          help='Index of the first episode shown')
+    replay_parser.add_argument('--step', type=int, default=0, required=False, dest="step",
+                          help='Step of the first episode to start from')
+    replay_parser.add_argument('--framerate', type=int, default=15, required=False, dest="framerate",
+                          help='Steps played per second')
 
     args = main_parser.parse_args()
 
@@ -41,7 +124,7 @@ def parse_commandline_args() -> tuple:
     else:
         pass
     
-    return args.mode, args.debug, getattr(args, 'checkpoint', None)
+    return args
 
 def get_last_directory_asc(base_path: str) -> str:
     """Returns path to the directory with the name in the last alphabetical order"""
@@ -60,59 +143,140 @@ def get_last_directory_asc(base_path: str) -> str:
         
     return latest_dir
 
-def run(mode: Gamemode, debug: bool = False, checkpoint_path: str = None):
+def grid_size_pixels_for(grid_num_squares: int) -> int:
+    """Returns the largest window size of at most 600 pixels fitting whole squares"""
+    return max(600 // grid_num_squares, 1) * grid_num_squares
+
+def saved_run_settings(args: argparse.Namespace, run_path: str):
+    """
+    Returns the settings of a training run with the board and observation options given on the command line replaced,
+    so that its models are played on the boards and observations they were trained with
+    """
+    from trainconfig import TrainConfig
+    return TrainConfig.load(run_path).updated(grid_num_squares=args.grid_size, obs_mode=args.obs_mode, view_size=args.view_size,
+                                              space_features=args.space_features)
+
+def run(args: argparse.Namespace):
+    mode: Gamemode = args.mode
+    debug: bool = args.debug
+    checkpoint_path: str = getattr(args, 'checkpoint', None)
+
     game_name: str = "Snake"
-    grid_size_pixels: int = 600
-    grid_num_squares: int = 20
     scratch_dir: str = "./.tmp/"
     model_checkpoints_dir: str = "model_checkpoints"
+
+    if mode == Gamemode.REPLAY:
+        from replay import view_replays
+        view_replays(args.file, episode_index=args.episode, step=args.step, framerate=args.framerate)
+        return
+    if mode == Gamemode.EXPORT:
+        from numpypolicy import export_checkpoint
+
+        checkpoints_path = os.path.join(scratch_dir, model_checkpoints_dir)
+        model_path = os.path.join(checkpoints_path, checkpoint_path or get_last_directory_asc(checkpoints_path), "snake_ppo_model")
+        policy = export_checkpoint(model_path + ".zip", model_path + ".npz")
+        print(f"Exported {len(policy.weights)} layers of {model_path}.zip to {model_path}.npz")
+        return
+
     training_run_prefix = datetime.now().strftime("%Y%m%d_%H%M")
 
     if mode == Gamemode.INTERACTIVE:
+        from game import TGame
+
         framerate: int = 10
-        tgame = TGame.initialize(game_name, grid_size_pixels, grid_num_squares, framerate, inputs_enabled=True, rendering_enabled=True, debug=debug)
+        grid_num_squares: int = args.grid_size
+        tgame = TGame.initialize(game_name, grid_size_pixels_for(grid_num_squares), grid_num_squares, framerate, inputs_enabled=True, rendering_enabled=True, debug=debug)
+        if args.record:
+            from replay import EpisodeRecorder
+            tgame.enable_recording(EpisodeRecorder(args.record))
         tgame.reset()
         tgame.start_game_loop()
     elif mode == Gamemode.AI:
         from ai_controller import AIController
 
+        if args.record and args.games > 1:
+            raise ValueError("--record is only available when playing a single game.")
+
         training_run_prefix = None
         if checkpoint_path:
             training_run_prefix = checkpoint_path
         else:
             training_run_prefix = get_last_directory_asc(os.path.join(scratch_dir, model_checkpoints_dir))
+        settings = saved_run_settings(args, os.path.join(scratch_dir, model_checkpoints_dir, training_run_prefix))
 
         ai_controller = AIController(
             game_name=game_name,
-            grid_size_pixels=grid_size_pixels,
-            grid_num_squares=grid_num_squares,
+            grid_size_pixels=grid_size_pixels_for(settings.grid_num_squares),
+            grid_num_squares=settings.grid_num_squares,
             framerate=15,
             scratch_dir=scratch_dir,
             model_checkpoints_dir=model_checkpoints_dir,
             training_run_prefix=training_run_prefix,
             inputs_enabled=False,
             rendering_enabled=True,
-            debug=debug
+            debug=debug,
+            obs_mode=settings.obs_mode,
+            view_size=settings.view_size,
+            record_path=args.record,
+            space_features=settings.space_features
         )
-        ai_controller.run()
+        if args.games > 1:
+            ai_controller.spectate(args.games)
+        else:
+            ai_controller.run()
     elif mode == Gamemode.TRAIN:
         from ai_controller import AIController
+        from trainconfig import TrainConfig
+
+        # Settings are layered: defaults, then the resumed run's saved settings, the config file and the command line
+        config = TrainConfig()
+        if args.resume:
+            training_run_prefix = args.resume
+            config = TrainConfig.load(os.path.join(scratch_dir, model_checkpoints_dir, training_run_prefix))
+        if args.config:
+            config = config.updated_from_file(args.config)
+        config = config.updated(grid_num_squares=args.grid_size,
+                                **{key: getattr(args, key) for key in ("num_envs", "vec_envs", "total_timesteps", "n_steps",
+                                                                       "batch_size", "learning_rate", "torch_threads", "curriculum",
+                                                                       "record_episodes", "step_kernel", "obs_mode", "view_size",
+                                                                       "space_features")})
+        # A curriculum plays its own board sizes only, the largest sizing the view
+        if config.view_size is None:
+            config = config.updated(view_size=max(config.curriculum) if config.curriculum else config.grid_num_squares)
+
         ai_controller = AIController(
             game_name=game_name,
-            grid_size_pixels=grid_size_pixels,
-            grid_num_squares=grid_num_squares,
+            grid_size_pixels=grid_size_pixels_for(config.grid_num_squares),
+            grid_num_squares=config.grid_num_squares,
             framerate=0,
             scratch_dir=scratch_dir,
             model_checkpoints_dir=model_checkpoints_dir,
             training_run_prefix=training_run_prefix,
             inputs_enabled=False,
             rendering_enabled=False,
-            debug=debug
+            debug=debug,
+            obs_mode=config.obs_mode,
+            view_size=config.view_size,
+            space_features=config.space_features
         )
-        ai_controller.train()
+        ai_controller.train(config, profile=args.profile, resume=args.resume is not None)
+    elif mode == Gamemode.EVAL:
+        from evaluation import evaluate_checkpoints, list_checkpoints, print_report
+
+        checkpoints_path = os.path.join(scratch_dir, model_checkpoints_dir)
+        training_run_prefix = checkpoint_path or get_last_directory_asc(checkpoints_path)
+        checkpoints = list_checkpoints(os.path.join(checkpoints_path, training_run_prefix), "snake_ppo_model")
+        if not checkpoints:
+            raise FileNotFoundError(f"No checkpoints found in {training_run_prefix}")
+        settings = saved_run_settings(args, os.path.join(checkpoints_path, training_run_prefix))
+
+        results = evaluate_checkpoints(checkpoints, settings.grid_num_squares, obs_mode=settings.obs_mode, episodes=args.episodes,
+                                       workers=args.workers, num_envs=args.vec_envs, seed=args.seed, view_size=settings.view_size,
+                                       space_features=settings.space_features)
+        print(f"Training run: {training_run_prefix}")
+        print_report(results)
 
     quit()
 
 if __name__=="__main__":
-    gamemode, debug, checkpoint_path = parse_commandline_args()
-    run(gamemode, debug, checkpoint_path)
\ No newline at end of file
+    run(parse_commandline_args())
\ No newline at end of file
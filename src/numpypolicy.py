@@ -0,0 +1,127 @@
+import os
+
+import numpy as np
+
+# Activations of exportable policy networks, by torch module name
+ACTIVATIONS = {
+    "Tanh": np.tanh,
+    "ReLU": lambda x, out: np.maximum(x, 0, out=out),
+}
+
+class NumpyPolicy:
+    """
+    Deterministic forward pass of an exported MlpPolicy: the policy layers followed by the action layer,
+    run with NumPy on float32 weights so that playing a trained model needs neither torch nor stable_baselines3.
+    Hidden activations are written into buffers preallocated for the last batch size seen.
+    """
+
+    def __init__(self, weights: list, biases: list, activation: str):
+        if activation not in ACTIVATIONS:
+            raise ValueError(f"Unsupported activation {activation}, expected one of {sorted(ACTIVATIONS)}")
+
+        # Stored as (inputs, outputs) so that a batch of rows is multiplied on the left
+        self.weights = [np.ascontiguousarray(w.T, dtype=np.float32) for w in weights]
+        self.biases = [np.ascontiguousarray(b, dtype=np.float32) for b in biases]
+        self.activation = activation
+        self.activation_fn = ACTIVATIONS[activation]
+        self.observation_size = self.weights[0].shape[0]
+        self.num_actions = self.weights[-1].shape[1]
+        self.buffers = None
+
+    @classmethod
+    def load(cls, path: str) -> "NumpyPolicy":
+        with np.load(path) as data:
+            num_layers = int(data["num_layers"])
+            return cls([data[f"weight_{i}"] for i in range(num_layers)],
+                       [data[f"bias_{i}"] for i in range(num_layers)],
+                       str(data["activation"]))
+
+    @classmethod
+    def from_model(cls, model) -> "NumpyPolicy":
+        """Extracts the weights of the actor of a stable_baselines3 model with an MlpPolicy on flat observations"""
+        from gymnasium import spaces
+
+        if not isinstance(model.observation_space, spaces.Box) or len(model.observation_space.shape) != 1:
+            raise ValueError(f"Only policies of flat observations can be exported, got {model.observation_space}")
+        if not isinstance(model.action_space, spaces.Discrete):
+            raise ValueError(f"Only policies of discrete actions can be exported, got {model.action_space}")
+
+        layers = list(model.policy.mlp_extractor.policy_net) + [model.policy.action_net]
+        linear = [layer for layer in layers if type(layer).__name__ == "Linear"]
+        activations = {type(layer).__name__ for layer in layers} - {"Linear"}
+        if len(activations) > 1:
+            raise ValueError(f"Policy networks mixing activations {sorted(activations)} cannot be exported")
+
+        return cls([layer.weight.detach().cpu().numpy() for layer in linear],
+                   [layer.bias.detach().cpu().numpy() for layer in linear],
+                   activations.pop() if activations else "Tanh")
+
+    def save(self, path: str):
+        arrays = {"num_layers": len(self.weights), "activation": self.activation}
+        for i, (w, b) in enumerate(zip(self.weights, self.biases)):
+            arrays[f"weight_{i}"] = w.T
+            arrays[f"bias_{i}"] = b
+        np.savez(path, **arrays)
+
+    def logits(self, obs: np.ndarray) -> np.ndarray:
+        """Returns the action logits of a (batch, observation_size) array, in a buffer overwritten by the next call"""
+        if self.buffers is None or len(self.buffers[0]) != len(obs):
+            self.buffers = [np.empty((len(obs), w.shape[1]), dtype=np.float32) for w in self.weights]
+
+        x = obs
+        last = len(self.weights) - 1
+        for i, (w, b, out) in enumerate(zip(self.weights, self.biases, self.buffers)):
+            np.dot(x, w, out=out)
+            out += b
+            if i < last:
+                self.activation_fn(out, out=out)
+            x = out
+        return x
+
+    def predict(self, obs: np.ndarray, deterministic: bool = True) -> tuple:
+        """
+        Returns (actions, None) like stable_baselines3's predict: an int for a single observation,
+        an array for a batch. Stochastic actions are sampled from the softmax of the logits.
+        """
+        single = obs.ndim == 1
+        batch = np.asarray(obs, dtype=np.float32).reshape(-1, self.observation_size)
+        logits = self.logits(batch)
+
+        if deterministic:
+            actions = logits.argmax(axis=1)
+        else:
+            # Gumbel-max trick: argmax of the logits plus Gumbel noise samples the softmax distribution
+            actions = (logits - np.log(-np.log(np.random.random(logits.shape)))).argmax(axis=1)
+        return (int(actions[0]) if single else actions), None
+
+def export_checkpoint(checkpoint_path: str, out_path: str) -> NumpyPolicy:
+    """Converts an MlpPolicy checkpoint saved by stable_baselines3 into a NumPy weights file"""
+    from stable_baselines3 import PPO
+
+    policy = NumpyPolicy.from_model(PPO.load(checkpoint_path, device="cpu"))
+    policy.save(out_path)
+    return policy
+
+def exported_or_checkpoint_path(checkpoint_path: str) -> str:
+    """Returns the path of the NumPy weights exported next to a .zip checkpoint when they are up to date, else the checkpoint's"""
+    npz_path = checkpoint_path[:-len(".zip")] + ".npz"
+    # Weights exported before the run was resumed are stale
+    if os.path.exists(npz_path) and (not os.path.exists(checkpoint_path) or os.path.getmtime(npz_path) >= os.path.getmtime(checkpoint_path)):
+        return npz_path
+    return checkpoint_path
+
+def load_policy(path: str):
+    """
+    Returns a model to predict actions with: a NumpyPolicy for exported .npz weights or exportable checkpoints,
+    converted in memory, and the stable_baselines3 model itself for other checkpoints.
+    """
+    if path.endswith(".npz"):
+        return NumpyPolicy.load(path)
+
+    from stable_baselines3 import PPO
+
+    model = PPO.load(path, device="cpu")
+    try:
+        return NumpyPolicy.from_model(model)
+    except ValueError:
+        return model
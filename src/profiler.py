@@ -0,0 +1,71 @@
+import time
+
+# Histogram buckets are powers of two of nanoseconds: bucket b counts durations in [2^(b-1), 2^b) ns
+NUM_BUCKETS = 40
+
+class PhaseProfiler:
+    """
+    Cumulative and histogram timings of named phases.
+
+    Phases are timed by wrapping methods of an object with instrument, so objects that are not
+    instrumented run their plain methods and pay nothing for profiling.
+    """
+
+    def __init__(self):
+        self.stats = {}
+
+    def record(self, phase: str, duration_ns: int):
+        stats = self.stats.get(phase)
+        if stats is None:
+            stats = self.stats[phase] = {"calls": 0, "total_ns": 0, "histogram": [0] * NUM_BUCKETS}
+
+        stats["calls"] += 1
+        stats["total_ns"] += duration_ns
+        stats["histogram"][min(duration_ns.bit_length(), NUM_BUCKETS - 1)] += 1
+
+    def instrument(self, obj, method_name: str, phase: str):
+        """Replaces obj.method_name by a wrapper recording the duration of every call under phase"""
+        method = getattr(obj, method_name)
+        record = self.record
+        perf_counter_ns = time.perf_counter_ns
+
+        def timed(*args, **kwargs):
+            start = perf_counter_ns()
+            result = method(*args, **kwargs)
+            record(phase, perf_counter_ns() - start)
+            return result
+
+        setattr(obj, method_name, timed)
+
+    def get_stats(self) -> dict:
+        """Returns {phase: {"calls", "total_ns", "histogram"}} accumulated since the last reset"""
+        return {phase: {"calls": s["calls"], "total_ns": s["total_ns"], "histogram": list(s["histogram"])}
+                for phase, s in self.stats.items()}
+
+    def reset(self):
+        self.stats = {}
+
+def merge_stats(stats_list: list) -> dict:
+    """Sums the stats of several profilers, e.g. one per vectorized env worker"""
+    merged = {}
+    for stats in stats_list:
+        for phase, s in stats.items():
+            m = merged.setdefault(phase, {"calls": 0, "total_ns": 0, "histogram": [0] * NUM_BUCKETS})
+            m["calls"] += s["calls"]
+            m["total_ns"] += s["total_ns"]
+            m["histogram"] = [a + b for a, b in zip(m["histogram"], s["histogram"])]
+    return merged
+
+def histogram_percentile(histogram: list, q: float) -> int:
+    """Returns an upper bound in nanoseconds of the q-th percentile (0..100) of a histogram"""
+    total = sum(histogram)
+    if total == 0:
+        return 0
+
+    target = total * q / 100
+    seen = 0
+    for bucket, count in enumerate(histogram):
+        seen += count
+        if seen >= target:
+            return 1 << bucket
+    return 1 << (len(histogram) - 1)
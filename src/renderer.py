@@ -3,73 +3,217 @@ from __future__ import annotations
 import pygame
 
 class Renderer:
+    """
+    Draws the game with dirty rectangles.
+
+    The background (and debug grid) is pre-rendered once and the score text is cached until the score changes.
+    Each frame only the cells that can change (previous/current head, previous/current tail and apple)
+    are restored from the background, repainted and pushed with pygame.display.update.
+    A new snake (e.g. after a reset) triggers a full redraw.
+    render_interpolated draws the head and tail part-way through the last move, for frames drawn between game ticks.
+    """
+
+    head_color = (0, 0, 255)
+    body_color = (0, 0, 100)
+    apple_color = (255, 0, 0)
 
     def __init__(self, tgame: TGame):
         pygame.display.set_caption(tgame.game_name)
         self.screen = pygame.display.set_mode((tgame.grid_size_pixels, tgame.grid_size_pixels))
         self.tgame = tgame
-    
-    def draw_background(self):
+        self.size_of_one_square = tgame.grid_size_pixels // tgame.grid_num_squares
+
+        self.font = pygame.font.Font(None, 36)
+        self.score_rendered = None
+        self.score_surface = None
+        self.score_rect = None
+
+        self.background = self.create_background()
+
+        # Snake and cells currently on screen, used to find what changed since the last frame
+        self.drawn_snake = None
+        self.drawn_cells = ()
+
+    def create_background(self) -> pygame.Surface:
+        background = pygame.Surface(self.screen.get_size())
+        self.draw_background(background)
+
+        if self.tgame.debug:
+            self.draw_grid(background)
+
+        return background
+
+    def draw_background(self, surface: pygame.Surface):
         black_color = (0, 0, 0)
 
         # draw background
-        self.screen.fill(black_color) # Fill black
+        surface.fill(black_color) # Fill black
 
-    def draw_grid(self):
+    def draw_grid(self, surface: pygame.Surface):
         white_color = (200, 200, 200)
 
-        size_of_one_square = int(self.tgame.grid_size_pixels / self.tgame.grid_num_squares)
-        
+        size_of_one_square = self.size_of_one_square
+
         # draw grid
         for x in range(0, self.tgame.grid_size_pixels, size_of_one_square):
             for y in range(0, self.tgame.grid_size_pixels, size_of_one_square):
                 rect = pygame.Rect(x, y, size_of_one_square, size_of_one_square)
-                pygame.draw.rect(self.screen, white_color, rect, 1)
+                pygame.draw.rect(surface, white_color, rect, 1)
 
-    def draw_snake(self):
-        head_color = (0, 0, 255)
-        body_color = (0, 0, 100)
-        size_of_one_square = self.tgame.grid_size_pixels / self.tgame.grid_num_squares
+    def cell_rect(self, x: int, y: int) -> pygame.Rect:
+        size_of_one_square = self.size_of_one_square
+        return pygame.Rect(x * size_of_one_square, y * size_of_one_square, size_of_one_square, size_of_one_square)
 
+    def draw_snake(self):
         # draw head
-        rect_head = pygame.Rect(self.tgame.tsnake.head_x * size_of_one_square, self.tgame.tsnake.head_y * size_of_one_square, size_of_one_square, size_of_one_square)
-        pygame.draw.rect(self.screen, head_color, rect_head)
+        pygame.draw.rect(self.screen, self.head_color, self.cell_rect(self.tgame.tsnake.head_x, self.tgame.tsnake.head_y))
 
         # draw body
         for sp in self.tgame.tsnake.snake_parts:
-            rect_body = pygame.Rect(sp[0] * size_of_one_square, sp[1] * size_of_one_square, size_of_one_square, size_of_one_square)
-            pygame.draw.rect(self.screen, body_color, rect_body)
+            pygame.draw.rect(self.screen, self.body_color, self.cell_rect(sp[0], sp[1]))
 
     def draw_apple(self):
-        apple_color = (255, 0, 0)
-        size_of_one_square = self.tgame.grid_size_pixels / self.tgame.grid_num_squares
+        if self.tgame.apple_coords is None:
+            return
 
-        # draw
         apple_x = self.tgame.apple_coords[0]
         apple_y = self.tgame.apple_coords[1]
-        rect_apple = pygame.Rect(apple_x * size_of_one_square, apple_y * size_of_one_square, size_of_one_square, size_of_one_square)
-        pygame.draw.rect(self.screen, apple_color, rect_apple)
-    
-    def draw_score(self):
-        font = pygame.font.Font(None, 36)
+        pygame.draw.rect(self.screen, self.apple_color, self.cell_rect(apple_x, apple_y))
+
+    def update_score_surface(self) -> bool:
+        """Renders the score text if the score changed, returns True if it did"""
+        if self.score_rendered == self.tgame.score:
+            return False
+
         score_text = f"Score: {self.tgame.score}"
-        text_surface = font.render(score_text, True, (255, 255, 255))  # White text
-        
+        self.score_surface = self.font.render(score_text, True, (255, 255, 255))  # White text
+        self.score_rendered = self.tgame.score
+
         # Position in top right with some padding
         padding = 10
-        text_rect = text_surface.get_rect()
-        text_rect.topright = (self.tgame.grid_size_pixels - padding, padding)
-        
-        self.screen.blit(text_surface, text_rect)    
+        self.score_rect = self.score_surface.get_rect()
+        self.score_rect.topright = (self.tgame.grid_size_pixels - padding, padding)
+        return True
 
-    def render_all(self):
-        self.draw_background()
+    def draw_score(self):
+        self.update_score_surface()
+        self.screen.blit(self.score_surface, self.score_rect)
 
-        if self.tgame.debug:
-            self.draw_grid()
+    def cell_color(self, x: int, y: int):
+        """Returns the color of the cell (x, y), None for an empty cell"""
+        tsnake = self.tgame.tsnake
+        if (x, y) == self.tgame.apple_coords:
+            return self.apple_color
+        if x == tsnake.head_x and y == tsnake.head_y:
+            return self.head_color
+        if tsnake.is_part_at(x, y):
+            return self.body_color
+        return None
+
+    def repaint_cell(self, x: int, y: int) -> pygame.Rect:
+        rect = self.cell_rect(x, y)
+        self.screen.blit(self.background, rect, rect)
+
+        color = self.cell_color(x, y)
+        if color is not None:
+            pygame.draw.rect(self.screen, color, rect)
+        return rect
+
+    def repaint_area(self, area: pygame.Rect):
+        """Repaints every cell intersecting area"""
+        size_of_one_square = self.size_of_one_square
+        last = self.tgame.grid_num_squares - 1
+        for x in range(max(area.left // size_of_one_square, 0), min((area.right - 1) // size_of_one_square, last) + 1):
+            for y in range(max(area.top // size_of_one_square, 0), min((area.bottom - 1) // size_of_one_square, last) + 1):
+                self.repaint_cell(x, y)
+
+    def tracked_cells(self) -> tuple:
+        tsnake = self.tgame.tsnake
+        cells = ((tsnake.head_x, tsnake.head_y), tsnake.snake_parts[0])
+        if self.tgame.apple_coords is not None:
+            cells += (self.tgame.apple_coords, )
+        return cells
+
+    def render_full(self):
+        self.screen.blit(self.background, (0, 0))
 
         self.draw_snake()
         self.draw_apple()
         self.draw_score()
 
-        pygame.display.flip()
\ No newline at end of file
+        pygame.display.flip()
+
+    def repaint_changes(self) -> list:
+        """Repaints the cells changed since the last frame and returns their rects, leaving the display update to the caller"""
+        current_cells = self.tracked_cells()
+        dirty_rects = [self.repaint_cell(x, y) for x, y in set(self.drawn_cells + current_cells)]
+        self.restore_score(dirty_rects)
+        return dirty_rects
+
+    def restore_score(self, dirty_rects: list):
+        """Cells repainted under the score text hide it, so the text is restored along with them"""
+        previous_score_rect = self.score_rect
+        score_changed = self.update_score_surface()
+        if score_changed or previous_score_rect.collidelist(dirty_rects) >= 0:
+            score_area = previous_score_rect.union(self.score_rect)
+            self.repaint_area(score_area)
+            self.screen.blit(self.score_surface, self.score_rect)
+            dirty_rects.append(score_area)
+
+    def render_all(self, full: bool = False):
+        """Draws the current state, repainting only the cells changed since the last frame unless full is set"""
+        tsnake = self.tgame.tsnake
+        if full or self.drawn_snake is not tsnake:
+            self.render_full()
+        else:
+            pygame.display.update(self.repaint_changes())
+
+        self.drawn_snake = tsnake
+        self.drawn_cells = self.tracked_cells()
+
+    def sliding_rect(self, start: tuple, end: tuple, alpha: float) -> pygame.Rect:
+        """Returns the square alpha of the way from cell start to the adjacent cell end"""
+        size_of_one_square = self.size_of_one_square
+        x = round((start[0] + (end[0] - start[0]) * alpha) * size_of_one_square)
+        y = round((start[1] + (end[1] - start[1]) * alpha) * size_of_one_square)
+        return pygame.Rect(x, y, size_of_one_square, size_of_one_square)
+
+    def render_interpolated(self, previous_head: tuple, previous_tail: tuple, alpha: float):
+        """
+        Draws the snake alpha of the way through its last move, alpha in [0, 1]: the head slides from previous_head
+        into its cell and the tail, unless the snake grew, from previous_tail to its cell.
+        The cells involved are repainted exactly by the next frame.
+        """
+        tsnake = self.tgame.tsnake
+        if self.drawn_snake is not tsnake:
+            self.render_all()
+            return
+
+        head = (tsnake.head_x, tsnake.head_y)
+        tail = tsnake.snake_parts[0]
+        dirty_rects = self.repaint_changes()
+
+        # The cells being entered and left are covered only by the sliding squares
+        cleared_cells = [head] if tail == previous_tail else [head, previous_tail]
+        cleared = [self.cell_rect(x, y) for x, y in cleared_cells]
+        sliding = [(self.head_color, self.sliding_rect(previous_head, head, alpha))]
+        if tail != previous_tail:
+            sliding.insert(0, (self.body_color, self.sliding_rect(previous_tail, tail, alpha)))
+
+        covers_score = self.score_rect.collidelist(cleared + [rect for _, rect in sliding]) >= 0
+        if covers_score:
+            self.repaint_area(self.score_rect)
+        for cell, rect in zip(cleared_cells, cleared):
+            self.screen.blit(self.background, rect, rect)
+            # An apple can spawn on the cell the tail is leaving
+            if cell == self.tgame.apple_coords:
+                pygame.draw.rect(self.screen, self.apple_color, rect)
+        for color, rect in sliding:
+            pygame.draw.rect(self.screen, color, rect)
+
+        if covers_score:
+            self.screen.blit(self.score_surface, self.score_rect)
+            dirty_rects.append(self.score_rect)
+        pygame.display.update(dirty_rects + cleared)
+
+        self.drawn_cells = self.tracked_cells() + (previous_head, previous_tail)
@@ -0,0 +1,302 @@
+from collections import deque
+import os
+
+import numpy as np
+
+from gamecore import TGameCore
+from snake import Orientation, TSnake
+
+# Header of every episode record, followed by num_actions uint8 actions and keyframes_size bytes of int32 keyframes
+RECORD_HEADER = np.dtype([
+    ("magic", "S4"),
+    ("seed", "<u8"),
+    ("grid_num_squares", "<u2"),
+    ("keyframe_interval", "<u4"),
+    ("num_actions", "<u4"),
+    ("keyframes_size", "<u4"),
+    ("score", "<u4"),
+])
+RECORD_MAGIC = b"SNKE"
+
+# Leading slots of a keyframe, followed by the body part cells (tail to neck) and the free cells in index order
+KEY_STEP, KEY_HEAD, KEY_ORIENTATION, KEY_SCORE, KEY_APPLE, KEY_NUM_PARTS = range(6)
+KEYFRAME_HEADER_SIZE = 6
+
+def capture_keyframe(tgame: TGameCore, step: int) -> np.ndarray:
+    """Returns the state of tgame after step actions as an int32 array, cells being stored as y * grid_num_squares + x"""
+    g = tgame.grid_num_squares
+    tsnake = tgame.tsnake
+    apple = -1 if tgame.apple_coords is None else tgame.apple_coords[1] * g + tgame.apple_coords[0]
+    parts = [y * g + x for x, y in tsnake.snake_parts]
+    header = [step, tsnake.head_y * g + tsnake.head_x, tsnake.head_orientation.value, tgame.score, apple, len(parts)]
+    return np.array(header + parts + tsnake.free_cells, dtype=np.int32)
+
+def restore_keyframe(tgame: TGameCore, keyframe: np.ndarray, seed: int):
+    """
+    Puts tgame in the state of keyframe, in an episode whose random generator was seeded with seed.
+    Apples are the only random draws, one at reset and one per apple eaten, so the generator is advanced by score + 1 draws.
+    """
+    g = tgame.grid_num_squares
+    num_parts = int(keyframe[KEY_NUM_PARTS])
+    parts = keyframe[KEYFRAME_HEADER_SIZE:KEYFRAME_HEADER_SIZE + num_parts]
+    free_cells = keyframe[KEYFRAME_HEADER_SIZE + num_parts:].tolist()
+
+    orientation = Orientation(int(keyframe[KEY_ORIENTATION]))
+    tsnake = TSnake(orientation, g)
+    tsnake.head_x = int(keyframe[KEY_HEAD]) % g
+    tsnake.head_y = int(keyframe[KEY_HEAD]) // g
+    tsnake.snake_parts = deque((int(cell) % g, int(cell) // g) for cell in parts)
+    tsnake.occupancy[:] = 0
+    np.add.at(tsnake.occupancy, (parts // g, parts % g), 1)
+    tsnake.free_cells = free_cells
+    tsnake.free_cell_positions = [-1] * (g * g)
+    for position, cell in enumerate(free_cells):
+        tsnake.free_cell_positions[cell] = position
+
+    tgame.tsnake = tsnake
+    apple = int(keyframe[KEY_APPLE])
+    tgame.apple_coords = None if apple < 0 else (apple % g, apple // g)
+    tgame.set_score(int(keyframe[KEY_SCORE]))
+    tgame.set_won(False)
+    tgame.set_terminated(False)
+
+    # Skip the whole batches drawn so far, then redraw the current batch
+    draws = int(keyframe[KEY_SCORE]) + 1
+    skipped = draws // tgame.rng_batch_size * tgame.rng_batch_size
+    rng = np.random.default_rng(seed)
+    rng.bit_generator.advance(skipped)
+    tgame.set_rng(rng)
+    tgame.random_batch = rng.random(tgame.rng_batch_size).tolist()
+    tgame.random_batch_index = draws - skipped
+
+class EpisodeRecorder:
+    """
+    Records the episodes of a game as replays appended to a file.
+
+    Each episode gets a fresh random generator seeded from the game's generator, which makes it deterministic
+    given its seed: a record holds the seed, one byte per action and, every keyframe_interval steps, a keyframe
+    of the full state to seek from. Records are written whole when the game resets or closes, so an interrupted
+    recording loses at most its current episode.
+    """
+
+    def __init__(self, path: str, keyframe_interval: int = 100):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.file = open(path, "ab")
+        self.keyframe_interval = keyframe_interval
+        self.tgame = None
+        self.seed = None
+        self.grid_num_squares = None
+        self.actions = bytearray()
+        self.keyframes = []
+        self.score = 0
+
+    def attach(self, tgame: TGameCore):
+        """Wraps the reset, perform_action and close methods of tgame to record its episodes"""
+        self.tgame = tgame
+        reset = tgame.reset
+        perform_action = tgame.perform_action
+        close = tgame.close
+
+        def recorded_reset():
+            self.end_episode()
+            # The board may be resized between episodes, before the reset that ends the previous one
+            self.grid_num_squares = tgame.grid_num_squares
+            self.seed = int(tgame.rng.integers(2 ** 63))
+            tgame.set_rng(np.random.default_rng(self.seed))
+            reset()
+
+        def recorded_perform_action(orientation: Orientation):
+            step = len(self.actions)
+            if step > 0 and step % self.keyframe_interval == 0:
+                self.keyframes.append(capture_keyframe(tgame, step))
+            self.actions.append(orientation.value)
+
+            result = perform_action(orientation)
+            self.score = max(self.score, tgame.score)
+            return result
+
+        def recorded_close():
+            self.close()
+            close()
+
+        tgame.reset = recorded_reset
+        tgame.perform_action = recorded_perform_action
+        tgame.close = recorded_close
+
+    def end_episode(self):
+        """Appends the current episode to the file, if any action was played"""
+        if self.seed is not None and len(self.actions) > 0:
+            keyframes = np.concatenate([np.concatenate(([len(k)], k)) for k in self.keyframes]).astype("<i4").tobytes() \
+                if self.keyframes else b""
+
+            header = np.zeros(1, dtype=RECORD_HEADER)
+            header["magic"] = RECORD_MAGIC
+            header["seed"] = self.seed
+            header["grid_num_squares"] = self.grid_num_squares
+            header["keyframe_interval"] = self.keyframe_interval
+            header["num_actions"] = len(self.actions)
+            header["keyframes_size"] = len(keyframes)
+            header["score"] = self.score
+            self.file.write(header.tobytes() + bytes(self.actions) + keyframes)
+
+        self.seed = None
+        self.actions = bytearray()
+        self.keyframes = []
+        self.score = 0
+
+    def close(self):
+        if not self.file.closed:
+            self.end_episode()
+            self.file.close()
+
+class ReplayEpisode:
+    """One recorded episode, its actions and keyframes being views of the memory-mapped file"""
+
+    def __init__(self, header: np.void, actions: np.ndarray, keyframes: np.ndarray):
+        self.seed = int(header["seed"])
+        self.grid_num_squares = int(header["grid_num_squares"])
+        self.score = int(header["score"])
+        self.actions = actions
+
+        # Keyframes are stored as length-prefixed int32 arrays
+        self.keyframes = {}
+        offset = 0
+        while offset < len(keyframes):
+            length = int(keyframes[offset])
+            keyframe = keyframes[offset + 1:offset + 1 + length]
+            self.keyframes[int(keyframe[KEY_STEP])] = keyframe
+            offset += 1 + length
+
+    def __len__(self) -> int:
+        return len(self.actions)
+
+    def seek(self, tgame: TGameCore, step: int):
+        """Puts tgame, of the episode's board size, in the state reached after step actions"""
+        step = min(max(step, 0), len(self.actions))
+        start = max((k for k in self.keyframes if k <= step), default=0)
+        if start > 0:
+            restore_keyframe(tgame, self.keyframes[start], self.seed)
+        else:
+            tgame.set_rng(np.random.default_rng(self.seed))
+            tgame.reset()
+
+        for action in self.actions[start:step].tolist():
+            tgame.perform_action(Orientation(action))
+
+    def check(self) -> TGameCore:
+        """Replays the episode, raising RuntimeError when the state at a keyframe differs from the recorded one"""
+        tgame = TGameCore.initialize("Snake replay", self.grid_num_squares, debug=False)
+        self.seek(tgame, 0)
+        for step, action in enumerate(self.actions.tolist()):
+            keyframe = self.keyframes.get(step)
+            if keyframe is not None and not np.array_equal(capture_keyframe(tgame, step), keyframe):
+                raise RuntimeError(f"Replay mismatch at step {step} of the episode seeded with {self.seed}")
+            tgame.perform_action(Orientation(action))
+        return tgame
+
+class ReplayFile:
+    """
+    Reads the episodes appended to a replay file by EpisodeRecorder through a memory map.
+    Opening only walks the record headers; a record cut short by an interrupted write ends the file.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.data = np.memmap(path, dtype=np.uint8, mode="r") if os.path.getsize(path) > 0 else np.zeros(0, dtype=np.uint8)
+        self.offsets = []
+
+        offset = 0
+        while offset + RECORD_HEADER.itemsize <= len(self.data):
+            header = np.frombuffer(self.data, dtype=RECORD_HEADER, count=1, offset=offset)[0]
+            if header["magic"] != RECORD_MAGIC:
+                raise ValueError(f"{path} is not a replay file, or is corrupted at byte {offset}")
+
+            end = offset + RECORD_HEADER.itemsize + int(header["num_actions"]) + int(header["keyframes_size"])
+            if end > len(self.data):
+                break
+            self.offsets.append(offset)
+            offset = end
+
+    def __len__(self) -> int:
+        return len(self.offsets)
+
+    def __getitem__(self, index: int) -> ReplayEpisode:
+        offset = self.offsets[index]
+        header = np.frombuffer(self.data, dtype=RECORD_HEADER, count=1, offset=offset)[0]
+        actions_offset = offset + RECORD_HEADER.itemsize
+        num_actions = int(header["num_actions"])
+        actions = self.data[actions_offset:actions_offset + num_actions]
+        keyframes = np.frombuffer(self.data, dtype="<i4", count=int(header["keyframes_size"]) // 4,
+                                  offset=actions_offset + num_actions)
+        return ReplayEpisode(header, actions, keyframes)
+
+def view_replays(path: str, episode_index: int = 0, step: int = 0, framerate: int = 15):
+    """
+    Plays the episodes of a replay file in a window, one after the other. Space pauses, Left/Right step back and forward,
+    Home restarts the episode and Page Up/Page Down switch to the previous/next episode.
+    """
+    import pygame
+    from game import TGame
+
+    replays = ReplayFile(path)
+    if len(replays) == 0:
+        raise ValueError(f"No episodes in {path}")
+
+    tgame = None
+    clock = pygame.time.Clock()
+    episode_index = min(max(episode_index, 0), len(replays) - 1)
+    paused = False
+    running = True
+    while running:
+        episode = replays[episode_index]
+        if tgame is None or tgame.grid_num_squares != episode.grid_num_squares:
+            grid_size_pixels = max(600 // episode.grid_num_squares, 1) * episode.grid_num_squares
+            tgame = TGame.initialize("Snake replay", grid_size_pixels, episode.grid_num_squares, framerate,
+                                     inputs_enabled=False, rendering_enabled=True, debug=False)
+        step = min(max(step, 0), len(episode))
+        episode.seek(tgame, step)
+
+        # Plays the episode until it ends or a key asks for another step or episode
+        target = None
+        moves = 0
+        while running and target is None:
+            # The renderer repaints the cells of one move, several moves since the last frame need a full redraw
+            tgame.renderer.render_all(full=moves > 1)
+            moves = 0
+            pygame.display.set_caption(f"Snake replay - episode {episode_index + 1}/{len(replays)}, "
+                                       f"step {step}/{len(episode)}, score {tgame.score}")
+            clock.tick(framerate)
+
+            for event in pygame.event.get():
+                if event.type == pygame.QUIT:
+                    running = False
+                elif event.type == pygame.KEYDOWN:
+                    if event.key == pygame.K_SPACE:
+                        paused = not paused
+                    elif event.key == pygame.K_LEFT:
+                        target = (episode_index, step - 1)
+                    elif event.key == pygame.K_RIGHT and step < len(episode):
+                        tgame.perform_action(Orientation(int(episode.actions[step])))
+                        step += 1
+                        moves += 1
+                    elif event.key == pygame.K_HOME:
+                        target = (episode_index, 0)
+                    elif event.key == pygame.K_PAGEUP:
+                        target = (max(episode_index - 1, 0), 0)
+                    elif event.key == pygame.K_PAGEDOWN:
+                        target = (min(episode_index + 1, len(replays) - 1), 0)
+
+            if not paused and target is None:
+                if step < len(episode):
+                    tgame.perform_action(Orientation(int(episode.actions[step])))
+                    step += 1
+                    moves += 1
+                elif episode_index < len(replays) - 1:
+                    target = (episode_index + 1, 0)
+
+        if target is not None:
+            episode_index, step = target
+
+    tgame.close()
@@ -1,6 +1,9 @@
+from collections import deque
 from dataclasses import dataclass
 from enum import Enum
 
+import numpy as np
+
 class Orientation(Enum):
     UP = 0
     RIGHT = 1
@@ -10,36 +13,89 @@ class Orientation(Enum):
 
 class TSnake:
 
-    def __init__(self, head_orientation: Orientation):
+    def __init__(self, head_orientation: Orientation, grid_num_squares: int):
         self.head_orientation = head_orientation
         self.orientation_before = head_orientation
         self.initial_length: int = 3
-        self.snake_parts = []
+        # Body parts from tail (left) to neck (right), head excluded
+        self.snake_parts = deque()
+        # Number of body parts on each cell, indexed [y, x]. Growing duplicates a part, so a cell can hold two.
+        self.occupancy = np.zeros((grid_num_squares, grid_num_squares), dtype=np.uint8)
         self.is_alive = True
 
-        for i in range(0, self.initial_length - 1):
-            self.add_snake_part((i, 0))
-        
+        # Indexed set of the cells covered by neither the head nor the body, stored as y * grid_num_squares + x.
+        # Cells are swap-removed from free_cells and free_cell_positions maps each cell to its index (-1 if not free).
+        self.grid_num_squares = grid_num_squares
+        self.free_cells = list(range(grid_num_squares * grid_num_squares))
+        self.free_cell_positions = list(range(grid_num_squares * grid_num_squares))
+
         self.head_x = self.initial_length - 1
         self.head_y = 0
+        self.__take_free_cell(self.head_x, self.head_y)
+
+        for i in range(0, self.initial_length - 1):
+            self.add_snake_part((i, 0))
 
     def move_snake_head(self, orientation: Orientation):
+        if self.occupancy.item(self.head_y, self.head_x) == 0:
+            self.__release_free_cell(self.head_x, self.head_y)
+
         self.head_y = self.head_y - 1 if orientation == Orientation.UP else self.head_y
         self.head_x = self.head_x + 1 if orientation == Orientation.RIGHT else self.head_x
         self.head_y = self.head_y + 1 if orientation == Orientation.DOWN else self.head_y
         self.head_x = self.head_x - 1 if orientation == Orientation.LEFT else self.head_x
+
+        self.__take_free_cell(self.head_x, self.head_y)
         
         self.orientation_before = self.head_orientation
         self.head_orientation = orientation
         
     def add_snake_part(self, coords: tuple):
         self.snake_parts.append(coords)
+        self.occupancy[coords[1], coords[0]] += 1
+        self.__take_free_cell(coords[0], coords[1])
     
     def remove_snake_part(self):
-        self.snake_parts.pop(0)
+        coords = self.snake_parts.popleft()
+        self.occupancy[coords[1], coords[0]] -= 1
+        if self.occupancy.item(coords[1], coords[0]) == 0 and coords != (self.head_x, self.head_y):
+            self.__release_free_cell(coords[0], coords[1])
+    
+    def is_part_at(self, x: int, y: int) -> bool:
+        """Returns True if a body part (head excluded) is on the in-bound cell (x, y)"""
+        return self.occupancy.item(y, x) > 0
+    
+    def num_free_cells(self) -> int:
+        return len(self.free_cells)
+    
+    def get_free_cell(self, index: int) -> tuple:
+        """Returns the coordinates of the free cell stored at index, 0 <= index < num_free_cells()"""
+        cell = self.free_cells[index]
+        return (cell % self.grid_num_squares, cell // self.grid_num_squares)
+    
+    def __take_free_cell(self, x: int, y: int):
+        cell = y * self.grid_num_squares + x
+        position = self.free_cell_positions[cell]
+        if position < 0:
+            return
+
+        # Swap-remove: move the last free cell into the vacated position
+        last_cell = self.free_cells.pop()
+        if last_cell != cell:
+            self.free_cells[position] = last_cell
+            self.free_cell_positions[last_cell] = position
+        self.free_cell_positions[cell] = -1
+    
+    def __release_free_cell(self, x: int, y: int):
+        cell = y * self.grid_num_squares + x
+        if self.free_cell_positions[cell] >= 0:
+            return
+
+        self.free_cell_positions[cell] = len(self.free_cells)
+        self.free_cells.append(cell)
     
     def grow_snake(self):
-        tail_part = self.snake_parts[len(self.snake_parts) - 1]
+        tail_part = self.snake_parts[-1]
         self.add_snake_part((tail_part[0], tail_part[1]))
     
     def move_snake(self, orientation: Orientation):
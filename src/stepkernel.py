@@ -0,0 +1,335 @@
+from collections.abc import Sequence
+
+import numpy as np
+
+from gamecore import TGameCore
+from profiler import PhaseProfiler
+from snake import Orientation
+
+try:
+    from numba import njit
+except ImportError:
+    njit = None
+
+# Compiled with Numba when it is installed, plain Python functions otherwise
+HAS_NUMBA = njit is not None
+
+def _jit(function):
+    return njit(cache=True)(function) if HAS_NUMBA else function
+
+# Head deltas (dx, dy) indexed by Orientation.value (UP, RIGHT, DOWN, LEFT)
+DIRECTION_DELTAS = np.array([[0, -1], [1, 0], [0, 1], [-1, 0]], dtype=np.int64)
+
+# Slots of the integer state header
+HEAD_X, HEAD_Y, ORIENTATION, BODY_START, BODY_LEN, APPLE_X, APPLE_Y, SCORE, NUM_FREE = range(9)
+HEADER_SIZE = 9
+
+# Results of step_kernel
+STEP_REVERSED, STEP_MOVED, STEP_ATE, STEP_DIED, STEP_WON = range(5)
+
+@_jit
+def _take_free_cell(header, free_cells, free_cell_positions, cell):
+    position = free_cell_positions[cell]
+    if position < 0:
+        return
+
+    # Swap-remove, in the same order as TSnake so apple draws pick the same cells
+    last = header[NUM_FREE] - 1
+    last_cell = free_cells[last]
+    header[NUM_FREE] = last
+    if last_cell != cell:
+        free_cells[position] = last_cell
+        free_cell_positions[last_cell] = position
+    free_cell_positions[cell] = -1
+
+@_jit
+def _release_free_cell(header, free_cells, free_cell_positions, cell):
+    if free_cell_positions[cell] >= 0:
+        return
+
+    free_cell_positions[cell] = header[NUM_FREE]
+    free_cells[header[NUM_FREE]] = cell
+    header[NUM_FREE] += 1
+
+@_jit
+def _push_body_part(header, body, occupancy, free_cells, free_cell_positions, x, y):
+    slot = (header[BODY_START] + header[BODY_LEN]) % body.shape[0]
+    body[slot, 0] = x
+    body[slot, 1] = y
+    header[BODY_LEN] += 1
+    occupancy[y, x] += 1
+    _take_free_cell(header, free_cells, free_cell_positions, y * occupancy.shape[1] + x)
+
+@_jit
+def step_kernel(header, body, occupancy, free_cells, free_cell_positions, deltas, action, random_value):
+    """
+    Moves, collides, eats and grows in one call on integer-coded state, following TGameCore.perform_action.
+    body is a ring buffer of (x, y) parts from tail to neck, occupancy counts body parts per [y, x] cell and
+    free_cells / free_cell_positions hold the free-cell index with its size in header[NUM_FREE].
+    random_value places the next apple and is only used when the result is STEP_ATE.
+    """
+    g = occupancy.shape[0]
+
+    # Reversals are refused and leave the state untouched
+    if action == (header[ORIENTATION] + 2) % 4:
+        return STEP_REVERSED
+
+    head_x = header[HEAD_X]
+    head_y = header[HEAD_Y]
+    new_x = head_x + deltas[action, 0]
+    new_y = head_y + deltas[action, 1]
+
+    if new_x < 0 or new_x >= g or new_y < 0 or new_y >= g or occupancy[new_y, new_x] > 0:
+        header[SCORE] = 0
+        return STEP_DIED
+
+    # Drop the tail
+    tail = header[BODY_START]
+    tail_x = body[tail, 0]
+    tail_y = body[tail, 1]
+    occupancy[tail_y, tail_x] -= 1
+    header[BODY_START] = (tail + 1) % body.shape[0]
+    header[BODY_LEN] -= 1
+    if occupancy[tail_y, tail_x] == 0 and (tail_x != head_x or tail_y != head_y):
+        _release_free_cell(header, free_cells, free_cell_positions, tail_y * g + tail_x)
+
+    # Move the head; its old cell is released and retaken by the neck, as TSnake does
+    if occupancy[head_y, head_x] == 0:
+        _release_free_cell(header, free_cells, free_cell_positions, head_y * g + head_x)
+    header[HEAD_X] = new_x
+    header[HEAD_Y] = new_y
+    header[ORIENTATION] = action
+    _take_free_cell(header, free_cells, free_cell_positions, new_y * g + new_x)
+    _push_body_part(header, body, occupancy, free_cells, free_cell_positions, head_x, head_y)
+
+    if new_x != header[APPLE_X] or new_y != header[APPLE_Y]:
+        return STEP_MOVED
+
+    # Grow by duplicating the neck
+    _push_body_part(header, body, occupancy, free_cells, free_cell_positions, head_x, head_y)
+    header[SCORE] += 1
+
+    num_free = header[NUM_FREE]
+    if num_free == 0:
+        header[APPLE_X] = -1
+        header[APPLE_Y] = -1
+        return STEP_WON
+
+    cell = free_cells[min(int(random_value * num_free), num_free - 1)]
+    header[APPLE_X] = cell % g
+    header[APPLE_Y] = cell // g
+    return STEP_ATE
+
+class KernelParts(Sequence):
+    """Body parts of a TKernelGame from tail to neck, read from its ring buffer as (x, y) tuples"""
+
+    def __init__(self, kgame: "TKernelGame"):
+        self.kgame = kgame
+
+    def __len__(self) -> int:
+        return self.kgame.header.item(BODY_LEN)
+
+    def __getitem__(self, index: int) -> tuple:
+        length = len(self)
+        if index < 0:
+            index += length
+        if not 0 <= index < length:
+            raise IndexError("snake part index out of range")
+
+        body = self.kgame.body
+        slot = (self.kgame.header.item(BODY_START) + index) % len(body)
+        return (body.item(slot, 0), body.item(slot, 1))
+
+    def __iter__(self):
+        return iter(self.kgame.snake_parts())
+
+class KernelSnake:
+    """
+    TSnake view of the state arrays of a TKernelGame, so that observation builders, action masks and recorders read
+    the kernel's state as they read a TSnake. The state is only changed by step_kernel.
+    """
+
+    def __init__(self, kgame: "TKernelGame"):
+        self.kgame = kgame
+        self.grid_num_squares = kgame.grid_num_squares
+        self.occupancy = kgame.occupancy
+        self.snake_parts = KernelParts(kgame)
+        self.is_alive = True
+
+    @property
+    def head_x(self) -> int:
+        return self.kgame.header.item(HEAD_X)
+
+    @property
+    def head_y(self) -> int:
+        return self.kgame.header.item(HEAD_Y)
+
+    @property
+    def head_orientation(self) -> Orientation:
+        return Orientation(self.kgame.header.item(ORIENTATION))
+
+    @property
+    def free_cells(self) -> list:
+        return self.kgame.free_cells[:self.kgame.header.item(NUM_FREE)].tolist()
+
+    def is_part_at(self, x: int, y: int) -> bool:
+        """Returns True if a body part (head excluded) is on the in-bound cell (x, y)"""
+        return self.occupancy.item(y, x) > 0
+
+    def num_free_cells(self) -> int:
+        return self.kgame.header.item(NUM_FREE)
+
+    def get_free_cell(self, index: int) -> tuple:
+        cell = self.kgame.free_cells.item(index)
+        return (cell % self.grid_num_squares, cell // self.grid_num_squares)
+
+    def set_alive(self, is_alive: bool):
+        self.is_alive = is_alive
+
+class TKernelGame(TGameCore):
+    """
+    Headless game stepped by step_kernel on integer-coded state arrays.
+    Uses the same rules and random draws as TGameCore, so both go through identical transitions from the same seed.
+    tsnake is a KernelSnake view of the arrays, which lets SnakeEnv run on the kernel (see its step_kernel option).
+    """
+
+    initial_length = 3
+
+    def reset(self):
+        g = self.grid_num_squares
+
+        self.header = np.zeros(HEADER_SIZE, dtype=np.int64)
+        # Growing duplicates a part, so a cell holds at most two body parts
+        self.body = np.zeros((2 * g * g, 2), dtype=np.int64)
+        self.occupancy = np.zeros((g, g), dtype=np.uint8)
+        self.free_cells = np.arange(g * g, dtype=np.int64)
+        self.free_cell_positions = np.arange(g * g, dtype=np.int64)
+        self.header[NUM_FREE] = g * g
+
+        self.header[HEAD_X] = self.initial_length - 1
+        self.header[ORIENTATION] = Orientation.RIGHT.value
+        _take_free_cell(self.header, self.free_cells, self.free_cell_positions, self.initial_length - 1)
+        for i in range(self.initial_length - 1):
+            _push_body_part(self.header, self.body, self.occupancy, self.free_cells, self.free_cell_positions, i, 0)
+
+        self.tsnake = KernelSnake(self)
+        self.set_won(False)
+        self.create_apple()
+        self.set_score(0)
+        self.set_terminated(False)
+
+    def enable_profiling(self, profiler: PhaseProfiler):
+        """
+        Times the action phase and the kernel call of every step with profiler. The kernel checks collisions
+        and spawns apples itself, so its call is one phase, and apple_spawn only counts the apples of resets.
+        """
+        profiler.instrument(self, "perform_action", "action")
+        profiler.instrument(self, "step", "kernel")
+        profiler.instrument(self, "create_apple", "apple_spawn")
+
+    def create_apple(self):
+        num_free_cells = int(self.header[NUM_FREE])
+        if num_free_cells == 0:
+            self.header[APPLE_X] = self.header[APPLE_Y] = -1
+            self.apple_coords = None
+            self.set_won(True)
+            return
+
+        cell = int(self.free_cells[min(int(self.next_random() * num_free_cells), num_free_cells - 1)])
+        self.header[APPLE_X] = cell % self.grid_num_squares
+        self.header[APPLE_Y] = cell // self.grid_num_squares
+        self.apple_coords = (cell % self.grid_num_squares, cell // self.grid_num_squares)
+
+    def step(self, action: int) -> int:
+        """Performs the action given as an Orientation value, returns one of the STEP_* results"""
+        result = step_kernel(self.header, self.body, self.occupancy, self.free_cells, self.free_cell_positions,
+                             DIRECTION_DELTAS, action, self.peek_random())
+
+        if result == STEP_ATE:
+            # The peeked draw placed the apple
+            self.random_batch_index += 1
+            self.apple_coords = (int(self.header[APPLE_X]), int(self.header[APPLE_Y]))
+            self.set_score(int(self.header[SCORE]))
+        elif result == STEP_DIED:
+            self.tsnake.set_alive(False)
+            self.set_score(0)
+        elif result == STEP_WON:
+            self.apple_coords = None
+            self.set_won(True)
+            self.set_score(int(self.header[SCORE]))
+        return result
+
+    def perform_action(self, orientation: Orientation) -> bool:
+        return self.step(orientation.value) in (STEP_MOVED, STEP_ATE, STEP_WON)
+
+    def snake_parts(self) -> list:
+        """Returns the body parts from tail to neck, head excluded"""
+        start = int(self.header[BODY_START])
+        indices = (start + np.arange(int(self.header[BODY_LEN]))) % len(self.body)
+        return [tuple(part) for part in self.body[indices].tolist()]
+
+def _state_of_tgame(tgame: TGameCore) -> dict:
+    tsnake = tgame.tsnake
+    return {
+        "head": (tsnake.head_x, tsnake.head_y),
+        "orientation": tsnake.head_orientation.value,
+        "snake_parts": list(tsnake.snake_parts),
+        "occupancy": tsnake.occupancy.tolist(),
+        "free_cells": list(tsnake.free_cells),
+        "apple": tgame.apple_coords,
+        "score": tgame.score,
+        "alive": tsnake.is_alive,
+        "won": tgame.is_won,
+    }
+
+def _state_of_kernel_game(kgame: TKernelGame) -> dict:
+    header = kgame.header
+    return {
+        "head": (int(header[HEAD_X]), int(header[HEAD_Y])),
+        "orientation": int(header[ORIENTATION]),
+        "snake_parts": kgame.snake_parts(),
+        "occupancy": kgame.occupancy.tolist(),
+        "free_cells": kgame.free_cells[:header[NUM_FREE]].tolist(),
+        "apple": kgame.apple_coords,
+        "score": kgame.score,
+        "alive": kgame.tsnake.is_alive,
+        "won": kgame.is_won,
+    }
+
+def check_against_tgame(grid_num_squares: int, policy, num_steps: int, seed: int) -> dict:
+    """
+    Differential check: plays num_steps actions of policy(tgame, rng) on a TGameCore and a TKernelGame seeded alike,
+    comparing the full state after every step. Raises RuntimeError on the first difference.
+    Returns the number of episodes and wins played along with the list of actions taken.
+    """
+    tgame = TGameCore.initialize("Snake check", grid_num_squares, debug=False, rng=np.random.default_rng(seed))
+    kgame = TKernelGame.initialize("Snake check", grid_num_squares, debug=False, rng=np.random.default_rng(seed))
+    rng = np.random.default_rng(seed)
+
+    tgame.reset()
+    kgame.reset()
+    actions = []
+    episodes = 0
+    wins = 0
+    for step in range(num_steps):
+        action = policy(tgame, rng)
+        actions.append(action)
+
+        moved = tgame.perform_action(Orientation(action))
+        kernel_moved = kgame.perform_action(Orientation(action))
+
+        expected = _state_of_tgame(tgame)
+        actual = _state_of_kernel_game(kgame)
+        if moved != kernel_moved:
+            raise RuntimeError(f"Step kernel mismatch at step {step}: moved {kernel_moved}, expected {moved}")
+        for key, value in expected.items():
+            if actual[key] != value:
+                raise RuntimeError(f"Step kernel mismatch at step {step} in {key}: {actual[key]}, expected {value}")
+
+        if not tgame.tsnake.is_alive or tgame.is_won:
+            episodes += 1
+            wins += tgame.is_won
+            tgame.reset()
+            kgame.reset()
+
+    return {"episodes": episodes, "wins": wins, "actions": actions}
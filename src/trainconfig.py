@@ -0,0 +1,79 @@
+from dataclasses import asdict, dataclass, fields, replace
+import json
+import os
+
+@dataclass(frozen=True)
+class TrainConfig:
+    """
+    Settings of a training run, loaded from a JSON file and/or command line overrides.
+    Each run saves its settings next to its checkpoints so that a resumed run continues with them,
+    and AI and evaluation modes observe the games as the run's models were trained to.
+    """
+
+    # Observation encoding, see envs.obsmodes.OBS_MODES
+    obs_mode: str = "flat"
+    # Board size trained without a curriculum
+    grid_num_squares: int = 20
+    # Observed grid size, resolved to the largest board trained when the run starts
+    view_size: int = None
+    # Append the reachable space features to the observations, see envs.spacefeatures
+    space_features: bool = False
+
+    # Subprocess envs, None for one per core
+    num_envs: int = None
+    # Games stepped in-process by a VecSnakeEnv instead of subprocesses, 0 to disable
+    vec_envs: int = 0
+    total_timesteps: int = 2_000_000
+    learning_rate: float = 0.0003
+    n_steps: int = 2048
+    batch_size: int = 64
+    n_epochs: int = 10
+    gamma: float = 0.99
+    gae_lambda: float = 0.95
+    clip_range: float = 0.2
+    ent_coef: float = 0.0
+    # Threads used by torch for the policy updates, None for torch's default
+    torch_threads: int = None
+    # Timesteps between two checkpoints, summed over all envs
+    checkpoint_freq: int = 100_000
+    # Periodic checkpoints kept on disk besides the best scoring one
+    keep_checkpoints: int = 5
+    # Append the episodes of every subprocess env to replay files in the run directory
+    record_episodes: bool = False
+    # Step subprocess envs with the step kernel on integer-coded state, see stepkernel.TKernelGame
+    step_kernel: bool = False
+    # Board sizes trained in turn, each for an equal share of total_timesteps
+    curriculum: tuple = None
+
+    file_name = "train_config.json"
+
+    @classmethod
+    def load(cls, directory: str) -> "TrainConfig":
+        """Returns the settings saved in directory, the defaults when none were saved"""
+        path = os.path.join(directory, cls.file_name)
+        return cls().updated_from_file(path) if os.path.exists(path) else cls()
+
+    def updated_from_file(self, path: str) -> "TrainConfig":
+        """Returns a copy with the settings listed in the JSON file at path replaced"""
+        with open(path) as f:
+            return self.updated(**json.load(f))
+
+    def updated(self, **settings) -> "TrainConfig":
+        """Returns a copy with the given settings replaced, settings set to None are ignored"""
+        known = {field.name for field in fields(self)}
+        unknown = set(settings) - known
+        if unknown:
+            raise ValueError(f"Unknown training settings {sorted(unknown)}, expected some of {sorted(known)}")
+
+        settings = {key: value for key, value in settings.items() if value is not None}
+        if "curriculum" in settings:
+            settings["curriculum"] = tuple(settings["curriculum"])
+        return replace(self, **settings)
+
+    def save(self, directory: str):
+        os.makedirs(directory, exist_ok=True)
+        with open(os.path.join(directory, self.file_name), "w") as f:
+            json.dump(asdict(self), f, indent=2)
+
+    def resolved_num_envs(self) -> int:
+        return self.num_envs or os.cpu_count() or 1
@@ -0,0 +1,64 @@
+import numpy as np
+
+from envs.snake_env import SnakeEnv
+from gamecore import TGameCore
+from replay import ReplayFile
+from snake import Orientation
+
+def play_episode(env: SnakeEnv, rng: np.random.Generator, max_steps: int) -> list:
+    """Plays random legal actions until the episode ends, returns the actions and the state after each of them"""
+    env.reset()
+    steps = []
+    for _ in range(max_steps):
+        action = int(rng.choice(np.flatnonzero(env.action_masks())))
+        _, _, terminated, truncated, _ = env.step(action)
+        tsnake = env.tgame.tsnake
+        steps.append((action, (tsnake.head_x, tsnake.head_y), env.tgame.apple_coords, env.tgame.score))
+        if terminated or truncated:
+            break
+    return steps
+
+def test_replays_keep_the_board_size_of_resized_episodes(tmp_path):
+    path = str(tmp_path / "resized.replay")
+    env = SnakeEnv("Snake test", 200, 10, 0, inputs_enabled=False, rendering_enabled=False, view_size=20,
+                   record_path=path, mask_collisions=True)
+    env.reset(seed=5)
+    rng = np.random.default_rng(5)
+
+    # The resize is applied by the reset that ends the episode played on the 10x10 board
+    episodes = [play_episode(env, rng, 200)]
+    env.set_grid_num_squares(20)
+    episodes.append(play_episode(env, rng, 200))
+    env.close()
+
+    replays = ReplayFile(path)
+    assert len(replays) == len(episodes)
+    for episode, steps, grid_num_squares in zip(replays, episodes, (10, 20)):
+        assert episode.grid_num_squares == grid_num_squares
+        assert episode.actions.tolist() == [action for action, *_ in steps]
+
+        tgame = TGameCore.initialize("Snake replay", episode.grid_num_squares, debug=False)
+        episode.seek(tgame, 0)
+        for step, (action, head, apple, score) in enumerate(steps):
+            tgame.perform_action(Orientation(action))
+            assert ((tgame.tsnake.head_x, tgame.tsnake.head_y), tgame.apple_coords, tgame.score) == (head, apple, score), step
+
+def test_env_replays_seek_from_keyframes(tmp_path):
+    path = str(tmp_path / "keyframes.replay")
+    env = SnakeEnv("Snake test", 200, 10, 0, inputs_enabled=False, rendering_enabled=False, record_path=path,
+                   mask_collisions=True)
+    env.reset(seed=7)
+    steps = play_episode(env, np.random.default_rng(7), env.steps_max)
+    env.close()
+
+    episode = ReplayFile(path)[0]
+    assert len(steps) > 100
+    assert sorted(episode.keyframes) == list(range(100, len(steps), 100))
+    episode.check()
+
+    # Seeking past a keyframe restores it and replays the actions after it only
+    for step in (99, 100, len(steps)):
+        tgame = TGameCore.initialize("Snake replay", episode.grid_num_squares, debug=False)
+        episode.seek(tgame, step)
+        action, head, apple, score = steps[step - 1]
+        assert ((tgame.tsnake.head_x, tgame.tsnake.head_y), tgame.apple_coords, tgame.score) == (head, apple, score), step
@@ -0,0 +1,42 @@
+import numpy as np
+import pytest
+
+from benchmark import POLICIES
+from envs.snake_env import SnakeEnv
+from stepkernel import check_against_tgame
+
+@pytest.mark.parametrize("policy_name", sorted(POLICIES))
+@pytest.mark.parametrize("grid_num_squares", [4, 6, 10])
+def test_kernel_matches_tgame(policy_name: str, grid_num_squares: int):
+    # Raises on the first differing state. Small boards are filled by the long snake, which covers duplicated parts and wins
+    check_against_tgame(grid_num_squares, POLICIES[policy_name], num_steps=3000, seed=7)
+
+@pytest.mark.parametrize("obs_mode", ["flat", "packed", "fov_rotated"])
+def test_snake_env_on_kernel_matches_tgame(obs_mode: str):
+    settings = dict(game_name="Snake test", grid_size_pixels=80, grid_num_squares=8, framerate=0, inputs_enabled=False,
+                    rendering_enabled=False, obs_mode=obs_mode, incremental_observation=True, mask_collisions=True,
+                    space_features=True)
+    env = SnakeEnv(**settings)
+    kernel_env = SnakeEnv(step_kernel=True, **settings)
+    rng = np.random.default_rng(0)
+
+    results = (env.reset(seed=3), kernel_env.reset(seed=3))
+    for step in range(2000):
+        policy = POLICIES["long_snake"] if step // 500 % 2 else POLICIES["random"]
+        action = policy(env.tgame, rng)
+        results = (env.step(action), kernel_env.step(action))
+
+        for expected, actual in zip(*results):
+            if isinstance(expected, dict):
+                assert expected.keys() == actual.keys()
+                for key in expected:
+                    np.testing.assert_array_equal(actual[key], expected[key], err_msg=f"step {step}, {key}")
+            else:
+                np.testing.assert_array_equal(actual, expected, err_msg=f"step {step}")
+
+        if results[0][2] or results[0][3]:
+            results = (env.reset(), kernel_env.reset())
+
+def test_kernel_runs_headless_only():
+    with pytest.raises(ValueError):
+        SnakeEnv("Snake test", 80, 8, 0, inputs_enabled=False, rendering_enabled=True, step_kernel=True)